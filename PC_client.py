@@ -9,6 +9,7 @@ import base64
 
 from image_recognition import model_inference
 from algo.pathfinding import task1
+from algo.pathfinding.plan_cache import PlanCache
 from image_recognition.stitch_images import stitching_images
 
 
@@ -29,7 +30,7 @@ class PCClient:
         self.client_socket = None
         self.msg_queue = Queue()
         self.send_message = False
-        self.t1 = task1.task1()
+        self.t1 = task1.task1(planCache=PlanCache(), smoothing=True) # fewer, longer commands to the STM
         self.image_record = []
         self.task_2 = TASK_2
         self.obs_order_count = 0
@@ -111,8 +112,8 @@ class PCClient:
                 message = json.loads(message)
                 if message["type"] == "START_TASK":
                     # Add algo implementation here:
-                    self.t1.generate_path(message)
-                    command = self.t1.get_command_to_next_obstacle() # get command to next, will pop from list automatically
+                    self.t1.start_planning(message) # later legs are planned while the robot drives
+                    command = self.t1.get_command_to_next_obstacle() # get command to next, will pop from list automatically, waits for the first leg
                     obs_id = str(self.t1.get_obstacle_id())
                     # Test code below
                     # command = {"type": "NAVIGATION", "data": {"commands": ["LF180"], "path": [[1, 2], [1, 3], [1, 4], [1, 5], [2, 5], [3, 5], [4, 5]]}}
@@ -12,4 +12,9 @@ MAP_Y0 = 50
 BORDER_THICKNESS = 5
 
 TURNING_RADIUS = 26.75
-REAR_AXLE_TO_CENTER = 9.5
\ No newline at end of file
+REAR_AXLE_TO_CENTER = 9.5
+
+# robot footprint (centered on the car center), used by the swept-footprint collision check
+CAR_LENGTH = 21
+CAR_WIDTH = 19
+FOOTPRINT_MARGIN = 2.5 # half a grid cell, covers quantising the car center to a cell
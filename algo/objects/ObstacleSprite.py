@@ -0,0 +1,37 @@
+import pygame
+import algo.utils as utils
+import algo.constants as c
+from algo.objects.Obstacle import Obstacle
+
+class ObstacleSprite(pygame.sprite.Sprite):
+    def __init__(self, obstacle: Obstacle) -> None:
+        """Sprite drawing an obstacle in the simulator
+
+        Args:
+            obstacle (Obstacle): obstacle to draw
+        """
+        pygame.sprite.Sprite.__init__(self)
+        self.obstacle = obstacle
+        self.image = pygame.image.load('algo/objects/images/obstacle.png')
+        self.rect = self.image.get_rect()
+        self.rect.bottomleft = utils.coords_to_pixelcoords(obstacle.x_g, obstacle.y_g)
+
+        if obstacle.facing == 'E':
+            self.image = pygame.transform.rotate(self.image, 270)
+        elif obstacle.facing == 'S':
+            self.image = pygame.transform.rotate(self.image, 180)
+        elif obstacle.facing == 'W':
+            self.image = pygame.transform.rotate(self.image, 90)
+
+class VirtualWall(pygame.sprite.Sprite):
+    def __init__(self, x_g: int, y_g: int) -> None:
+        pygame.sprite.Sprite.__init__(self)
+        self.x_g = x_g - 3
+        self.y_g = y_g - 3
+        self.width = (min(self.x_g + 8, c.GRID_SIZE) - self.x_g)*200/c.GRID_SIZE*c.MAP_WIDTH/200
+        self.height = (min(self.y_g + 8, c.GRID_SIZE) - self.y_g)*200/c.GRID_SIZE*c.MAP_HEIGHT/200
+        
+        self.image = pygame.Surface((self.width, self.height))
+        self.image.fill((255, 0, 0, 24))
+        self.rect = self.image.get_rect()
+        self.rect.bottomleft = utils.coords_to_pixelcoords(self.x_g, self.y_g)
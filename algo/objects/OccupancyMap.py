@@ -4,17 +4,29 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__ + '\..')))
 
 from objects.Obstacle import Obstacle
 import utils
+import constants as c
 import numpy as np
+import heapq
+import math
+from collections import OrderedDict
 from typing import List
 import matplotlib.pyplot as plt
 from simulation.testing import get_maps
 
+# distance fields shared by all maps with the same occupancy grid, keyed by (grid hash, goal cell),
+# least recently used first
+_distance_fields = OrderedDict()
+DISTANCE_FIELD_CACHE_SIZE = 256 # 40x40 fields, ~3MB
+
 class OccupancyMap:
-    def __init__(self, obstacles: List[Obstacle]=[]) -> None:
+    def __init__(self, obstacles: List[Obstacle]=[], footprint: bool=False, thetaBins: int=24) -> None:
         """OccupancyMap Constructor
 
         Args:
             obstacles (List[Obstacle]): list of obstacle objects
+            footprint (bool, optional): also build per heading bin configuration space grids for
+                checking the full car footprint. Defaults to False.
+            thetaBins (int, optional): number of heading bins of the configuration space grids. Defaults to 24.
 
         Parameters:
             xmin (float): left border
@@ -25,6 +37,9 @@ class OccupancyMap:
             grid_vertices (np.array): 41x41 np array grid vertices for path planning (agent travels along grid lines)
             grid_display (np.array): 40x40 np array grid representing map for display purposes
             checkpoints (List[Checkpoint]): list of checkpoint objects
+            cspace_grids (np.array): thetaBins x 40 x 40 boolean grids, True where the car center
+                cannot be for headings in that bin (only built in footprint mode)
+            checkpointCache (dict): checkpoints around each obstacle, filled by hamiltonian.scan_checkpoints
         """
 
         assert len(obstacles) <= 8      # ensure list has at most 8 obstacles
@@ -32,6 +47,10 @@ class OccupancyMap:
         self.obstacles = []
 
         self.occupancy_grid = np.zeros((40, 40))  # 40x40 occupancy grid
+        self.footprint = footprint
+        self.thetaBins = thetaBins
+        self.cspace_grids = None
+        self.checkpointCache = {}
         
         self.add_obstacles_to_grids(obstacles)
 
@@ -44,6 +63,7 @@ class OccupancyMap:
         assert len(self.obstacles) + len(obstacles) <= 8    # ensure list has at most 8 obstacles
 
         self.obstacles += obstacles     # add obstacles to obstacle list
+        self.checkpointCache = {}       # checkpoints depend on the grid
 
         self.occupancy_grid[:3, :] = 1
         self.occupancy_grid[-3:, :] = 1
@@ -61,15 +81,144 @@ class OccupancyMap:
             j_end = min(obstacle.y_g + 4, 39)       # 39: last index
             self.occupancy_grid[i_start:i_end+1, j_start:j_end+1] = 1
 
-        
+        if self.footprint:
+            self.build_cspace_grids()
+
+    def build_cspace_grids(self) -> None:
+        """Build a configuration space grid for every heading bin
+
+        A cell is blocked for a heading bin if the car footprint centered in that cell, at any
+        heading in the bin, overlaps an obstacle. Each grid is the obstacle grid dilated by the
+        rotated footprint, so checking a pose is a single lookup. The arena border keeps the same
+        band as occupancy_grid (car center only), which leaves the start zone open.
+        """
+        cellSize = 200/c.GRID_SIZE
+        obstacle_grid = np.zeros((c.GRID_SIZE, c.GRID_SIZE), dtype=bool)
+        for obstacle in self.obstacles:
+            obstacle_grid[max(obstacle.x_g, 0):obstacle.x_g + 2, max(obstacle.y_g, 0):obstacle.y_g + 2] = True
+
+        border_grid = np.ones((c.GRID_SIZE, c.GRID_SIZE), dtype=bool)
+        border_grid[3:-3, 3:-3] = False
+        border_grid &= self.occupancy_grid.astype(bool)
+
+        # footprint sample points in the car frame, no more than half a cell apart
+        halfLength = c.CAR_LENGTH/2 + c.FOOTPRINT_MARGIN
+        halfWidth = c.CAR_WIDTH/2 + c.FOOTPRINT_MARGIN
+        u, v = np.meshgrid(np.linspace(-halfLength, halfLength, int(np.ceil(2*halfLength/(cellSize/2))) + 1),
+                           np.linspace(-halfWidth, halfWidth, int(np.ceil(2*halfWidth/(cellSize/2))) + 1))
+        u, v = u.ravel(), v.ravel()
+
+        binWidth = 2*np.pi/self.thetaBins
+        pad = int(np.ceil(np.hypot(halfLength, halfWidth)/cellSize)) + 1
+        padded = np.zeros((c.GRID_SIZE + 2*pad, c.GRID_SIZE + 2*pad), dtype=bool)
+        padded[pad:-pad, pad:-pad] = obstacle_grid
+
+        self.cspace_grids = np.zeros((self.thetaBins, c.GRID_SIZE, c.GRID_SIZE), dtype=bool)
+        for theta_g in range(self.thetaBins):
+            # both edges and the middle of the bin
+            thetas = -np.pi + binWidth*(theta_g + np.array([[0.], [0.5], [1.]]))
+            offset_x = u*np.cos(thetas) - v*np.sin(thetas)
+            offset_y = u*np.sin(thetas) + v*np.cos(thetas)
+            offsets = np.unique(np.stack([np.floor((cellSize/2 + offset_x.ravel())/cellSize),
+                                          np.floor((cellSize/2 + offset_y.ravel())/cellSize)], axis=1).astype(int), axis=0)
+
+            for di, dj in offsets:
+                self.cspace_grids[theta_g] |= padded[pad + di:pad + di + c.GRID_SIZE, pad + dj:pad + dj + c.GRID_SIZE]
+
+            self.cspace_grids[theta_g] |= border_grid
 
     def collide_with_point(self, x, y):
         x_g, y_g = utils.coords_to_grid(x, y)
-        if x_g < 0 or x_g >= 40 or y_g < 0 or y_g >= 40:
+        if x_g < 0 or x_g >= c.GRID_SIZE or y_g < 0 or y_g >= c.GRID_SIZE:
             return 1
         else:
             return self.occupancy_grid[x_g, y_g]
 
+    def collide_with_points(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """collide_with_point for arrays of points
+
+        Args:
+            x (np.ndarray): x coordinates
+            y (np.ndarray): y coordinates
+
+        Returns:
+            np.ndarray: boolean array, True where the point is occupied or outside the map
+        """
+        cellSize = 200/c.GRID_SIZE
+        x_g = np.floor_divide(x, cellSize).astype(int)
+        y_g = np.floor_divide(y, cellSize).astype(int)
+
+        outside = (x_g < 0) | (x_g >= c.GRID_SIZE) | (y_g < 0) | (y_g >= c.GRID_SIZE)
+        return outside | (self.occupancy_grid[np.clip(x_g, 0, c.GRID_SIZE - 1), np.clip(y_g, 0, c.GRID_SIZE - 1)] != 0)
+
+    def collide_with_poses(self, x: np.ndarray, y: np.ndarray, theta: np.ndarray) -> np.ndarray:
+        """Check car footprints against the configuration space grids (footprint mode only)
+
+        Args:
+            x (np.ndarray): x coordinates of car center
+            y (np.ndarray): y coordinates of car center
+            theta (np.ndarray): car headings in radians
+
+        Returns:
+            np.ndarray: boolean array, True where the car footprint collides
+        """
+        cellSize = 200/c.GRID_SIZE
+        x_g = np.floor_divide(x, cellSize).astype(int)
+        y_g = np.floor_divide(y, cellSize).astype(int)
+        theta_g = np.floor_divide(np.asarray(theta) + np.pi, 2*np.pi/self.thetaBins).astype(int) % self.thetaBins
+
+        outside = (x_g < 0) | (x_g >= c.GRID_SIZE) | (y_g < 0) | (y_g >= c.GRID_SIZE)
+        return outside | self.cspace_grids[theta_g, np.clip(x_g, 0, c.GRID_SIZE - 1), np.clip(y_g, 0, c.GRID_SIZE - 1)]
+
+    def distance_field(self, x: float, y: float) -> np.ndarray:
+        """Shortest 8-connected distance in cm from every free cell of occupancy_grid to the cell of (x, y)
+
+        Computed once per goal cell with Dijkstra and cached across maps with the same occupancy_grid, the
+        DISTANCE_FIELD_CACHE_SIZE most recently used fields are kept.
+
+        Args:
+            x (float): x coordinate of goal
+            y (float): y coordinate of goal
+
+        Returns:
+            np.ndarray: 40x40 distances, np.inf for occupied or unreachable cells
+        """
+        x_g, y_g = utils.coords_to_grid(x, y)
+        key = (hash(self.occupancy_grid.tobytes()), x_g, y_g)
+
+        if key in _distance_fields:
+            _distance_fields.move_to_end(key)
+
+        else:
+            cellSize = 200/c.GRID_SIZE
+            steps = [(di, dj, cellSize*math.hypot(di, dj)) for di in (-1, 0, 1) for dj in (-1, 0, 1) if di or dj]
+            free = (self.occupancy_grid == 0).tolist()
+            dist = [[math.inf]*c.GRID_SIZE for _ in range(c.GRID_SIZE)]
+
+            # goal cell is the source even if occupied, so goals next to obstacles still get a field
+            if 0 <= x_g < c.GRID_SIZE and 0 <= y_g < c.GRID_SIZE:
+                dist[x_g][y_g] = 0
+                open = [(0, x_g, y_g)]
+            else:
+                open = []
+
+            while open:
+                d, i, j = heapq.heappop(open)
+                if d > dist[i][j]:
+                    continue
+
+                for di, dj, step in steps:
+                    i_n, j_n = i + di, j + dj
+                    if 0 <= i_n < c.GRID_SIZE and 0 <= j_n < c.GRID_SIZE and free[i_n][j_n] and d + step < dist[i_n][j_n]:
+                        dist[i_n][j_n] = d + step
+                        heapq.heappush(open, (d + step, i_n, j_n))
+
+            _distance_fields[key] = np.array(dist)
+            if len(_distance_fields) > DISTANCE_FIELD_CACHE_SIZE:
+                _distance_fields.popitem(last=False)
+
+        return _distance_fields[key]
+
 if __name__ == '__main__':
     maps = get_maps()
     map = OccupancyMap(maps[0])
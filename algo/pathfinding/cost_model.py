@@ -0,0 +1,80 @@
+import json
+import math
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__ + '\..')))
+
+from enumerations import Steering
+from typing import List
+
+CALIBRATION_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'time_calibration.json')
+CALIBRATION_FIELDS = ['commandOverhead', 'secondsPerCm', 'secondsPerDegree', 'gearChange', 'steeringChange']
+
+class TimeCostModel():
+    def __init__(self, commandOverhead: float, secondsPerCm: float, secondsPerDegree: float, gearChange: float=0,
+                 steeringChange: float=0) -> None:
+        """Estimated execution time of motion primitives on the robot, pass as HybridAStar(costModel=...)
+
+        Every construct_path_2 command stops the car, waits for the STM ACK and starts again, so a change of
+        action costs commandOverhead on top of the time to drive it. Use load() to read the constants from
+        a calibration file rather than setting them in code.
+
+        Args:
+            commandOverhead (float): seconds lost for every command
+            secondsPerCm (float): seconds to drive 1cm straight
+            secondsPerDegree (float): seconds to turn 1 degree at the minimum turning radius
+            gearChange (float, optional): extra seconds when the gear changes between commands. Defaults to 0.
+            steeringChange (float, optional): extra seconds when the steering changes between commands. Defaults to 0.
+        """
+        self.commandOverhead = commandOverhead
+        self.secondsPerCm = secondsPerCm
+        self.secondsPerDegree = secondsPerDegree
+        self.gearChange = gearChange
+        self.steeringChange = steeringChange
+
+    @classmethod
+    def load(cls, path: str=CALIBRATION_PATH) -> 'TimeCostModel':
+        """Cost model with the constants of a calibration file, see time_calibration.json
+
+        Args:
+            path (str, optional): JSON calibration file. Defaults to CALIBRATION_PATH.
+        """
+        with open(path) as f:
+            calibration = json.load(f)
+
+        missing = [field for field in CALIBRATION_FIELDS if field not in calibration]
+        assert not missing, f"{path} is missing {', '.join(missing)}"
+        return cls(**{field: float(calibration[field]) for field in CALIBRATION_FIELDS})
+
+    def to_dict(self) -> dict:
+        return {field: getattr(self, field) for field in CALIBRATION_FIELDS}
+
+    def step_cost(self, choice: tuple, L: float, minR: float) -> float:
+        """Seconds to drive one primitive of (gear, steering)
+        """
+        if choice[1] == Steering.STRAIGHT:
+            return L*self.secondsPerCm
+
+        return math.degrees(L/minR)*self.secondsPerDegree
+
+    def switch_cost(self, prev: tuple, choice: tuple) -> float:
+        """Seconds lost starting a command of choice after a command of prev, 0 if they are the same command
+        """
+        if prev == choice:
+            return 0.
+
+        return self.commandOverhead + self.gearChange*(prev[0] != choice[0]) + self.steeringChange*(prev[1] != choice[1])
+
+    def seconds_per_cm(self, minR: float) -> float:
+        """Fewest seconds per cm travelled, scales path length heuristics to seconds without overestimating
+        """
+        return min(self.secondsPerCm, math.degrees(1/minR)*self.secondsPerDegree)
+
+    def path_seconds(self, choices: List[tuple], L: float, minR: float) -> float:
+        """Estimated execution time of a sequence of (gear, steering) primitives, e.g. the prevAction of a path
+        """
+        seconds = self.commandOverhead if choices else 0.
+        for prev, choice in zip(choices[:1] + choices, choices):
+            seconds += self.step_cost(choice, L, minR) + self.switch_cost(prev, choice)
+
+        return seconds
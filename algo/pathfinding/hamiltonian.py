@@ -8,6 +8,7 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__ + '\..')))
 import utils
 from objects.Obstacle import Obstacle
 import pathfinding.reeds_shepp as rs
+from pathfinding.hybrid_astar import HybridAStar
 import constants as c
 import copy
 
@@ -72,64 +73,191 @@ class Hamiltonian():
         
         return path
 
-def obstacle_to_checkpoint(map, obstacle: Obstacle, theta_offset):
-    starting_x, starting_y = utils.grid_to_coords(obstacle.x_g, obstacle.y_g)
-    starting_x += offset_x(obstacle.facing)
-    starting_y += offset_y(obstacle.facing)
-    starting_image_to_pos_theta = offset_theta(obstacle.facing, np.pi)
+    def find_optimal_path(self):
+        """Shortest obstacle order, found with Held-Karp dynamic programming over the pairwise
+        checkpoint distances instead of enumerating permutations
 
-    theta_scan_list = [0, np.pi/36, -np.pi/36, np.pi/18, -np.pi/18, np.pi/12, -np.pi/12, 
-                       np.pi/9, -np.pi/9, np.pi/7.2, -np.pi/7.2, np.pi/6, -np.pi/6, 
-                       np.pi*180/35, -np.pi*180/35, np.pi/4.5, -np.pi/4.5, np.pi/4, -np.pi/4]
-    r_scan_list = [20, 19, 21, 18, 22, 17, 23, 16, 24, 15, 25, 26, 27, 28, 29, 30]
+        Returns:
+            List[Obstacle]: obstacles in visiting order, obstacles without a checkpoint are left out
+        """
+        obstacles = []
+        checkpoints = []
+        for obstacle in self.obstacles:
+            checkpoint = obstacle_to_checkpoint(self.map, obstacle, self.theta_offset)
+            if checkpoint != None:
+                obstacles.append(obstacle)
+                checkpoints.append(checkpoint)
 
-    
-    for r_scan in r_scan_list:
-        for theta_scan in theta_scan_list:
-            cur_image_to_pos_theta = utils.M(starting_image_to_pos_theta + theta_scan)
-            cur_x = starting_x + r_scan*np.cos(cur_image_to_pos_theta)
-            cur_y = starting_y + r_scan*np.sin(cur_image_to_pos_theta)
-            theta = utils.M(cur_image_to_pos_theta - theta_offset)
-
-            if not map.collide_with_point(cur_x, cur_y) and not \
-                map.collide_with_point(cur_x + 0.5*c.REAR_AXLE_TO_CENTER*np.cos(theta), cur_y + 0.5*c.REAR_AXLE_TO_CENTER*np.sin(theta)) and not \
-                map.collide_with_point(cur_x - 0.5*c.REAR_AXLE_TO_CENTER*np.cos(theta), cur_y - 0.5*c.REAR_AXLE_TO_CENTER*np.sin(theta)):
-                
-                cur_x -= c.REAR_AXLE_TO_CENTER*np.cos(theta)
-                cur_y -= c.REAR_AXLE_TO_CENTER*np.sin(theta)
-                return (cur_x, cur_y, theta, obstacle.id)
+        order = held_karp(self.cost_matrix(checkpoints))
+        return [obstacles[i] for i in order]
+
+    def find_planner_cost_path(self, L: float, heuristic: str='euclidean', steeringChangeCost=10, gearChangeCost=10, 
+                               failCost: float=10000):
+        """Shortest obstacle order by HybridAStar path length
+
+        Held-Karp runs on a matrix of Reeds-Shepp lengths, which are lower bounds of the planned
+        lengths. Every edge of the best tour that is still a bound is replaced by the length of the
+        path HybridAStar actually finds, and the tour is recomputed, until the best tour only uses
+        planned lengths. Planned lengths are kept in costMatrix and exact.
+
+        Args:
+            L (float): HybridAStar step length in cm
+            heuristic (str, optional): HybridAStar heuristic. Defaults to 'euclidean'.
+            failCost (float, optional): cost of a leg HybridAStar cannot find. Defaults to 10000.
+
+        Returns:
+            List[Obstacle]: obstacles in visiting order, obstacles without a checkpoint are left out
+        """
+        obstacles = []
+        checkpoints = []
+        for obstacle in self.obstacles:
+            checkpoint = obstacle_to_checkpoint(self.map, obstacle, self.theta_offset)
+            if checkpoint != None:
+                obstacles.append(obstacle)
+                checkpoints.append(checkpoint)
+
+        self.costMatrix = self.cost_matrix(checkpoints, metric='reeds-shepp')
+        self.exact = np.eye(len(checkpoints) + 1, dtype=bool)
+        self.exact[:, 0] = True
+
+        poses = [self.start] + [checkpoint[:3] for checkpoint in checkpoints]
+        while True:
+            order = held_karp(self.costMatrix)
+            edges = [(i, j) for i, j in zip([0] + [k + 1 for k in order], [k + 1 for k in order]) if not self.exact[i, j]]
+            if not edges:
+                break
+
+            for i, j in edges:
+                algo = HybridAStar(self.map, poses[i][0], poses[i][1], poses[i][2], poses[j][0], poses[j][1], poses[j][2], 
+                                   steeringChangeCost=steeringChangeCost, gearChangeCost=gearChangeCost, 
+                                   L=L, minR=self.minR, heuristic=heuristic)
+                path, _ = algo.find_path()
+                self.costMatrix[i, j] = len(path)*L if path != None else failCost
+                self.exact[i, j] = True
+
+        return [obstacles[i] for i in order]
+
+    def cost_matrix(self, checkpoints, metric: str=None):
+        """Distances between the start and checkpoints
+
+        Args:
+            checkpoints (list): (x, y, theta, ...) checkpoints
+            metric (str, optional): 'euclidean' or 'reeds-shepp'. Defaults to None, the metric of the Hamiltonian.
+
+        Returns:
+            np.ndarray: (n+1) x (n+1) matrix, entry [i, j] is the distance from i to j, index 0 is the start
+        """
+        metric = metric or self.metric
+        poses = [self.start] + [checkpoint[:3] for checkpoint in checkpoints]
+        cost = np.zeros((len(poses), len(poses)))
+        for i, pose in enumerate(poses):
+            for j, other in enumerate(poses):
+                if i == j or j == 0:
+                    continue
+                if metric == 'euclidean':
+                    cost[i, j] = utils.l2(pose[0], pose[1], other[0], other[1])
+                elif metric == 'reeds-shepp':
+                    cost[i, j] = rs.get_optimal_path_length(pose, other, self.minR)
 
-    return None
+        return cost
+
+def held_karp(cost):
+    """Cheapest order to visit every node starting from node 0, without returning to it
+
+    Args:
+        cost (np.ndarray): (n+1) x (n+1) matrix, entry [i, j] is the cost from i to j
+
+    Returns:
+        List[int]: visiting order of nodes 1..n, as indices 0..n-1
+    """
+    n = len(cost) - 1
+    if n == 0:
+        return []
+
+    # best[mask, j]: cheapest cost from node 0 through the nodes in mask ending at node j+1
+    best = np.full((1 << n, n), np.inf)
+    parent = np.full((1 << n, n), -1, dtype=int)
+    for j in range(n):
+        best[1 << j, j] = cost[0, j + 1]
+
+    for mask in range(1, 1 << n):
+        for j in range(n):
+            if not mask & (1 << j) or best[mask, j] == np.inf:
+                continue
+            for k in range(n):
+                if mask & (1 << k):
+                    continue
+                newCost = best[mask, j] + cost[j + 1, k + 1]
+                if newCost < best[mask | (1 << k), k]:
+                    best[mask | (1 << k), k] = newCost
+                    parent[mask | (1 << k), k] = j
+
+    mask = (1 << n) - 1
+    j = int(np.argmin(best[mask]))
+    order = []
+    while j != -1:
+        order.append(j)
+        mask, j = mask ^ (1 << j), int(parent[mask, j])
+
+    return order[::-1]
+
+# candidate distances and angles from the image, in preference order
+R_SCAN_LIST = [20, 19, 21, 18, 22, 17, 23, 16, 24, 15, 25, 26, 27, 28, 29, 30]
+THETA_SCAN_LIST = [0, np.pi/36, -np.pi/36, np.pi/18, -np.pi/18, np.pi/12, -np.pi/12, 
+                   np.pi/9, -np.pi/9, np.pi/7.2, -np.pi/7.2, np.pi/6, -np.pi/6, 
+                   np.pi*180/35, -np.pi*180/35, np.pi/4.5, -np.pi/4.5, np.pi/4, -np.pi/4]
+ALL_THETA_SCANS = 13 # obstacle_to_checkpoint_all only uses the first 13 angles
+
+def obstacle_to_checkpoint(map, obstacle: Obstacle, theta_offset):
+    """Most preferred valid checkpoint of an obstacle, None if there is none
+    """
+    return scan_checkpoints(map, obstacle, theta_offset)[0]
 
 def obstacle_to_checkpoint_all(map, obstacle: Obstacle, theta_offset):
+    """Valid checkpoints of an obstacle in preference order, the list can be modified by the caller
+    """
+    return list(scan_checkpoints(map, obstacle, theta_offset)[1])
+
+def scan_checkpoints(map, obstacle: Obstacle, theta_offset):
+    """Scan every candidate checkpoint around an obstacle at once, cached in map.checkpointCache
+
+    A candidate is valid if the car center and the points half way to the front and rear
+    of the car are free.
+
+    Returns:
+        (tuple, tuple): most preferred valid checkpoint (or None) and the valid checkpoints
+            from the first ALL_THETA_SCANS angles, each (x, y, theta, obstacle id) of rear axle
+    """
+    key = (obstacle.x_g, obstacle.y_g, obstacle.facing, obstacle.id, theta_offset)
+    if key in map.checkpointCache:
+        return map.checkpointCache[key]
+
     starting_x, starting_y = utils.grid_to_coords(obstacle.x_g, obstacle.y_g)
     starting_x += offset_x(obstacle.facing)
     starting_y += offset_y(obstacle.facing)
     starting_image_to_pos_theta = offset_theta(obstacle.facing, np.pi)
 
-    valid_checkpoints = []
+    # rows are distances, columns are angles
+    r_scan = np.array(R_SCAN_LIST, dtype=float)[:, None]
+    cur_image_to_pos_theta = utils.M_array(starting_image_to_pos_theta + np.array(THETA_SCAN_LIST))[None, :]
+    cur_x = starting_x + r_scan*np.cos(cur_image_to_pos_theta)
+    cur_y = starting_y + r_scan*np.sin(cur_image_to_pos_theta)
+    theta = np.broadcast_to(utils.M_array(cur_image_to_pos_theta - theta_offset), cur_x.shape)
 
-    theta_scan_list = [0, np.pi/36, -np.pi/36, np.pi/18, -np.pi/18, np.pi/12, -np.pi/12, np.pi/9, -np.pi/9, np.pi/7.2, -np.pi/7.2, np.pi/6, -np.pi/6]
-    r_scan_list = [20, 19, 21, 18, 22, 17, 23, 16, 24, 15, 25, 26, 27, 28, 29, 30]
-    
-    
-    for r_scan in r_scan_list:
-        for theta_scan in theta_scan_list:
-            cur_image_to_pos_theta = utils.M(starting_image_to_pos_theta + theta_scan)
-            cur_x = starting_x + r_scan*np.cos(cur_image_to_pos_theta)
-            cur_y = starting_y + r_scan*np.sin(cur_image_to_pos_theta)
-            theta = utils.M(cur_image_to_pos_theta - theta_offset)
-
-            if not map.collide_with_point(cur_x, cur_y) and not \
-                map.collide_with_point(cur_x + 0.5*c.REAR_AXLE_TO_CENTER*np.cos(theta), cur_y + 0.5*c.REAR_AXLE_TO_CENTER*np.sin(theta)) and not \
-                map.collide_with_point(cur_x - 0.5*c.REAR_AXLE_TO_CENTER*np.cos(theta), cur_y - 0.5*c.REAR_AXLE_TO_CENTER*np.sin(theta)):
-                
-                cur_x -= c.REAR_AXLE_TO_CENTER*np.cos(theta)
-                cur_y -= c.REAR_AXLE_TO_CENTER*np.sin(theta)
-                valid_checkpoints.append((cur_x, cur_y, theta, obstacle.id))
+    valid = ~(map.collide_with_points(cur_x, cur_y) | 
+              map.collide_with_points(cur_x + 0.5*c.REAR_AXLE_TO_CENTER*np.cos(theta), cur_y + 0.5*c.REAR_AXLE_TO_CENTER*np.sin(theta)) |
+              map.collide_with_points(cur_x - 0.5*c.REAR_AXLE_TO_CENTER*np.cos(theta), cur_y - 0.5*c.REAR_AXLE_TO_CENTER*np.sin(theta)))
+
+    cur_x = cur_x - c.REAR_AXLE_TO_CENTER*np.cos(theta)
+    cur_y = cur_y - c.REAR_AXLE_TO_CENTER*np.sin(theta)
+    checkpoints = [(x, y, t, obstacle.id) for x, y, t in zip(cur_x[valid].tolist(), cur_y[valid].tolist(), theta[valid].tolist())]
 
-    return valid_checkpoints
+    ranked = valid.ravel().nonzero()[0]
+    in_all = (ranked % len(THETA_SCAN_LIST)) < ALL_THETA_SCANS
+    map.checkpointCache[key] = (checkpoints[0] if checkpoints else None, 
+                                tuple(checkpoint for checkpoint, keep in zip(checkpoints, in_all) if keep))
 
+    return map.checkpointCache[key]
 
 def offset_x(facing: str):
     if facing == 'N':
@@ -10,12 +10,129 @@ from objects.Obstacle import Obstacle
 from typing import List
 import utils
 import constants as c
-from queue import PriorityQueue
+from functools import lru_cache
+import heapq
+import itertools
 import time
 import pathfinding.reeds_shepp as rs
+import pathfinding.rs_table as rs_table
+from pathfinding.search_stats import SearchStats
+from pathfinding.cost_model import TimeCostModel
 
 import matplotlib.pyplot as plt #to remove
 
+GOAL_TOLERANCE_XY = 3.5 # cm
+GOAL_TOLERANCE_THETA = np.pi/24
+
+def within_goal_tolerance(pose: tuple, goal: tuple) -> bool:
+    """Whether an (x, y, theta) pose is within the goal tolerance of another, headings wrap around
+    """
+    dtheta = abs(pose[2] - goal[2])
+    return abs(pose[0] - goal[0]) <= GOAL_TOLERANCE_XY and abs(pose[1] - goal[1]) <= GOAL_TOLERANCE_XY and \
+        (dtheta <= GOAL_TOLERANCE_THETA or abs(dtheta - 2*np.pi) <= GOAL_TOLERANCE_THETA)
+
+@lru_cache(maxsize=None)
+def motion_primitives(L: float, minR: float):
+    """Motion primitive table for a step length and turning radius, built once and cached
+
+    Each (gear, steering) choice moves the rear axle by the same displacement when expressed
+    in the frame of the current pose, so only the rotation into the world frame depends on
+    the current heading. Child poses match the arc center construction only up to rounding
+    (~1e-14), which is enough to move a pose across a cell boundary, so the nodes expanded by
+    a single search can go up or down compared to it.
+
+    Args:
+        L (float): distance travelled each step in cm
+        minR (float): minimum turning radius in cm
+
+    Returns:
+        tuple: ((gear, steering), dx, dy, dtheta, cos(dtheta), sin(dtheta)) for every choice,
+            with (dx, dy) in the frame of the current pose
+    """
+    primitives = []
+    for gear in [Gear.FORWARD, Gear.REVERSE]:
+        for steering in [Steering.LEFT, Steering.STRAIGHT, Steering.RIGHT]:
+            if steering == Steering.STRAIGHT:
+                dx, dy, dtheta = gear*L, 0., 0.
+            else:
+                dtheta = -gear*steering*L/minR
+                dx = -steering*minR*math.sin(dtheta)
+                dy = -steering*minR*(1 - math.cos(dtheta))
+
+            primitives.append(((gear, steering), dx, dy, dtheta, math.cos(dtheta), math.sin(dtheta)))
+
+    return tuple(primitives)
+
+@lru_cache(maxsize=None)
+def primitive_sweeps(L: float, minR: float, stepSize: float=2.5):
+    """Car center poses swept by every motion primitive, built once and cached
+
+    Args:
+        L (float): distance travelled each step in cm
+        minR (float): minimum turning radius in cm
+        stepSize (float, optional): maximum distance between samples along a primitive in cm. Defaults to 2.5.
+
+    Returns:
+        (np.array, np.array, np.array): x, y offsets of the car center and heading change, each of
+            shape (number of primitives, samples), in the frame of the current rear axle pose
+    """
+    fractions = np.arange(1, int(np.ceil(L/stepSize)) + 1)/np.ceil(L/stepSize)
+    sweep_x, sweep_y, sweep_theta = [], [], []
+
+    for (gear, steering), _, _, dtheta, _, _ in motion_primitives(L, minR):
+        if steering == Steering.STRAIGHT:
+            dx, dy, dthetas = gear*L*fractions, 0*fractions, 0*fractions
+        else:
+            dthetas = dtheta*fractions
+            dx = -steering*minR*np.sin(dthetas)
+            dy = -steering*minR*(1 - np.cos(dthetas))
+
+        sweep_x.append(dx + c.REAR_AXLE_TO_CENTER*np.cos(dthetas))
+        sweep_y.append(dy + c.REAR_AXLE_TO_CENTER*np.sin(dthetas))
+        sweep_theta.append(dthetas)
+
+    return np.array(sweep_x), np.array(sweep_y), np.array(sweep_theta)
+
+def drive_primitives(map: OccupancyMap, L: float, minR: float, pose: tuple, actions: List[int]):
+    """Follow motion primitives from a pose, checking collisions the same way as HybridAStar checks children
+    (car center after each step, or the footprint swept along it in footprint mode)
+
+    Args:
+        map (OccupancyMap): map to check collisions against
+        L (float): distance travelled each step in cm
+        minR (float): minimum turning radius in cm
+        pose (tuple): (x, y, theta) of rear axle to start from
+        actions (List[int]): indices of the primitives to drive, see motion_primitives
+
+    Returns:
+        list: (primitive index, x, y, theta) after every step, None on a collision
+    """
+    primitives = motion_primitives(L, minR)
+    if map.footprint:
+        sweep_x, sweep_y, sweep_theta = primitive_sweeps(L, minR)
+
+    x, y, theta = pose
+    steps = []
+    for i in actions:
+        _, dx, dy, dtheta, _, _ = primitives[i]
+        cos_t, sin_t = math.cos(theta), math.sin(theta)
+
+        if map.footprint and map.collide_with_poses(x + sweep_x[i]*cos_t - sweep_y[i]*sin_t,
+                                                    y + sweep_x[i]*sin_t + sweep_y[i]*cos_t,
+                                                    theta + sweep_theta[i]).any():
+            return None
+
+        x, y = x + dx*cos_t - dy*sin_t, y + dx*sin_t + dy*cos_t
+        theta = utils.normalise_theta(theta + dtheta) if dtheta else theta
+
+        if not map.footprint and map.collide_with_point(x + c.REAR_AXLE_TO_CENTER*math.cos(theta),
+                                                        y + c.REAR_AXLE_TO_CENTER*math.sin(theta)):
+            return None
+
+        steps.append((i, x, y, theta))
+
+    return steps
+
 class Node():
     def __init__(self, x: float, y: float, theta: float, 
                  prevAction, parent=None) -> None:
@@ -38,16 +155,102 @@ class Node():
 
     def __eq__(self, other):
 
-        return abs(self.x - other.x) <= 3.5 and abs(self.y - other.y) <= 3.5 and \
-        (abs(self.theta - other.theta) <= np.pi/24 or abs(abs(self.theta - other.theta) - 2*np.pi) <= np.pi/24)
+        return within_goal_tolerance((self.x, self.y, self.theta), (other.x, other.y, other.theta))
     
     def __lt__(self, other):
         return self.f < other.f
 
+class NodePool():
+    def __init__(self, capacity: int=4096) -> None:
+        """Struct of arrays storage for search nodes, nodes are referred to by index
+
+        Args:
+            capacity (int, optional): initial number of nodes, doubled whenever full. Defaults to 4096.
+
+        Parameters:
+            x, y, theta (np.array): rear axle pose of each node
+            g, f (np.array): cost so far and total estimated cost of each node
+            parent (np.array): index of the parent node, -1 for the start node
+            action (np.array): index of the (gear, steering) choice taken from the parent
+        """
+        self.x = np.empty(capacity)
+        self.y = np.empty(capacity)
+        self.theta = np.empty(capacity)
+        self.g = np.empty(capacity)
+        self.f = np.empty(capacity)
+        self.parent = np.empty(capacity, dtype=np.int64)
+        self.action = np.empty(capacity, dtype=np.int8)
+        self.size = 0
+
+    def add(self, x: float, y: float, theta: float, g: float, f: float, parent: int, action: int) -> int:
+        if self.size == len(self.x):
+            self.grow()
+
+        index = self.size
+        self.x[index] = x
+        self.y[index] = y
+        self.theta[index] = theta
+        self.g[index] = g
+        self.f[index] = f
+        self.parent[index] = parent
+        self.action[index] = action
+        self.size += 1
+
+        return index
+
+    def grow(self) -> None:
+        for name in ['x', 'y', 'theta', 'g', 'f', 'parent', 'action']:
+            array = getattr(self, name)
+            setattr(self, name, np.concatenate([array, np.empty_like(array)]))
+
+    def to_nodes(self, indices: List[int], choices) -> List[Node]:
+        """Build linked Node objects for the given node indices, sharing parents between them
+
+        Args:
+            indices (List[int]): node indices
+            choices (list): (gear, steering) choice of each action index
+
+        Returns:
+            List[Node]: one Node per index, with parent pointers back to the start node
+        """
+        built = {}
+        result = []
+        for index in indices:
+            chain = []
+            while index != -1 and index not in built:
+                chain.append(index)
+                index = int(self.parent[index])
+
+            for i in reversed(chain):
+                parent = int(self.parent[i])
+                node = Node(float(self.x[i]), float(self.y[i]), float(self.theta[i]), choices[self.action[i]],
+                            parent=built[parent] if parent != -1 else None)
+                node.g = float(self.g[i])
+                node.f = float(self.f[i])
+                built[i] = node
+
+            result.append(built[indices[len(result)]])
+
+        return result
+
+    def reconstruct_path(self, index: int, choices) -> List[Node]:
+        """Path from the start node (excluded) to the given node by walking parent indices
+        """
+        indices = []
+        while self.parent[index] != -1:
+            indices.append(index)
+            index = int(self.parent[index])
+
+        indices.reverse()
+        return self.to_nodes(indices, choices)
+
 class HybridAStar():
     def __init__(self, map: OccupancyMap, x_0: float=15, y_0: float=10, theta_0: float=np.pi/2, 
                  x_f: float=15, y_f: float=180, theta_f: float=np.pi/2, theta_offset: float=0, steeringChangeCost=10, gearChangeCost=20,
-                    L: float=5, minR: float=25, heuristic: str='hybriddiag', simulate: bool=False, thetaBins=24):
+                    L: float=5, minR: float=25, heuristic: str='hybriddiag', simulate: bool=False, thetaBins=24,
+                    analyticExpansion: bool=False, shotInterval: int=40, shotRadius: float=0,
+                    stopCondition=None, goals: List[tuple]=None, weight: float=1, stats: SearchStats=None,
+                    bidirectional: bool=False, cellSize: float=200/c.GRID_SIZE, costModel: TimeCostModel=None):
         """HybridAStar constructor
 
         Args:
@@ -63,6 +266,31 @@ class HybridAStar():
             gearChangeCost (int, optional): extra cost for changing gear input. Defaults to 20.
             L (float, optional): distance travel each step in cm. Defaults to 5.
             minR (float, optional): minimum turning radius in cm. Defaults to 25.
+            heuristic (str, optional): 'rs-table' interpolates Reeds-Shepp lengths from a precomputed table
+                in pathfinding/rs_tables, built on first use for each minR, which can overestimate by a few cm
+                so paths are not guaranteed optimal. 'rs-grid' is the larger of the Reeds-Shepp length and the
+                obstacle-aware grid distance of the car center to the goal, 2-3x fewer expansions than
+                'euclidean' but each is slower, ~5x the wall time overall.
+                Defaults to 'hybriddiag'.
+            analyticExpansion (bool, optional): try to reach the goal directly along a Reeds-Shepp path every
+                shotInterval expansions and for every node within shotRadius cm of the goal. Defaults to False.
+            stopCondition (callable, optional): polled every 256 expansions, the search gives up when it
+                returns True. Defaults to None.
+            goals (List[tuple], optional): candidate (x, y, theta, ...) end poses, e.g. from obstacle_to_checkpoint_all.
+                The search stops at the first pose matching any of them, the heuristic is the minimum over
+                all goals and x_f, y_f, theta_f are set to the goal reached. Defaults to None.
+            weight (float, optional): heuristic weight, f = g + weight*h. Defaults to 1.
+            stats (SearchStats, optional): collects counters, phase timers and expansion callbacks of every
+                search. Defaults to None.
+            bidirectional (bool, optional): find_path also searches backward from the goal with reversed motion
+                primitives, see find_path_bidirectional. Single goal only. Defaults to False.
+            cellSize (float, optional): side of the search lattice cells in cm, together with thetaBins sets the
+                resolution of visited states. Visited states are kept in dicts, so finer lattices only cost for the
+                states reached. Independent of the occupancy grid. Defaults to 200/c.GRID_SIZE.
+            costModel (TimeCostModel, optional): search for the fastest path to execute instead of the shortest,
+                g is in estimated seconds including the overhead of every command, replacing steeringChangeCost
+                and gearChangeCost. The heuristic is scaled to seconds. Visited states also include the last
+                action, so searches expand more nodes. Defaults to None.
         """
         
         assert -np.pi <= theta_0, theta_f <= np.pi
@@ -86,130 +314,703 @@ class HybridAStar():
         self.heuristic = heuristic
         self.simulate = simulate
         self.thetaBins = thetaBins
+        self.cellSize = cellSize
+        self.analyticExpansion = analyticExpansion
+        self.shotInterval = shotInterval
+        self.shotRadius = shotRadius
+        self.stopCondition = stopCondition
+        self.weight = weight
+        self.stats = stats
+        self.bidirectional = bidirectional
+        self.costModel = costModel
+        self.upperBound = math.inf # children with g + h above this are pruned, set by find_path_anytime
+        self.nodesExpanded = 0 # of the last find_path
+        self.goals = None
+        self.goalReached = None
+        if goals:
+            self.goals = np.array([goal[:3] for goal in goals], dtype=float)
+            self.x_f, self.y_f, self.theta_f = self.goals[0].tolist()
+            self.goalHash = self.build_goal_hash()
+
+        assert not (bidirectional and goals), "bidirectional search has a single goal"
+
+        self.rsTable = rs_table.get_table(minR) if heuristic == 'rs-table' else None
+        self.distanceField = None
+        if heuristic == 'rs-grid':
+            self.distanceField = np.minimum.reduce([map.distance_field(x + c.REAR_AXLE_TO_CENTER*np.cos(theta), 
+                                                                       y + c.REAR_AXLE_TO_CENTER*np.sin(theta))
+                                                    for x, y, theta in (self.goals if goals else [(x_f, y_f, theta_f)])])
+        self.startDistanceField = None # rs-grid heuristic of the backward search
+        if heuristic == 'rs-grid' and bidirectional:
+            self.startDistanceField = map.distance_field(x_0 + c.REAR_AXLE_TO_CENTER*np.cos(theta_0), 
+                                                         y_0 + c.REAR_AXLE_TO_CENTER*np.sin(theta_0))
 
     def find_path(self):
+        if self.bidirectional:
+            return self.find_path_bidirectional()
+
         start = time.process_time()
+        stats = self.stats
+        if stats is not None:
+            stats.searches += 1
+            phaseStart = time.perf_counter()
         pathHistory = []
-        gearChoices = [Gear.FORWARD, Gear.REVERSE]
-        steeringChoices = [Steering.LEFT, Steering.STRAIGHT, Steering.RIGHT]
-        choices = [(gear, steering) for gear in gearChoices for steering in steeringChoices]
+        primitives = motion_primitives(self.L, self.minR)
+        if self.map.footprint:
+            sweep_x, sweep_y, sweep_theta = primitive_sweeps(self.L, self.minR)
 
-        startNode = Node(self.x, self.y, self.theta, (Gear.FORWARD, Steering.STRAIGHT))
-        endNode = Node(self.x_f, self.y_f, self.theta_f, (Gear.FORWARD, Steering.STRAIGHT))
+        # nodes store the index of their action in choices, opposite[i] undoes choice i
+        choices = [choice for choice, _, _, _, _, _ in primitives]
+        opposite = [choices.index((-gear, -steering)) for gear, steering in choices]
+        stepCosts, switchCosts, startCosts, extraCosts, hScale = self.cost_terms(choices)
+        # with a cost model the cost to go also depends on the last action (whether the next step starts a
+        # new command), so the action is part of the visited state
+        keyActions = self.costModel is not None
 
-        open = PriorityQueue()
-        close = PriorityQueue()
-        openList = 999999*np.ones((c.GRID_SIZE, c.GRID_SIZE, self.thetaBins + 1))
-        closedList = 999999*np.ones((c.GRID_SIZE, c.GRID_SIZE, self.thetaBins + 1))
+        nodes = NodePool()
+        startIndex = nodes.add(self.x, self.y, self.theta, 0, 0, -1, choices.index((Gear.FORWARD, Steering.STRAIGHT)))
 
-        open.put((startNode.f, startNode))
+        # open set entries are (f, tiebreak counter, node index), ties pop in insertion order
+        open = []
+        counter = itertools.count()
+        # best f of the open and closed entries of each visited (x_g, y_g, theta_g) cell, (x_g, y_g, theta_g, action)
+        # with a cost model
+        openList = {}
+        closedList = {}
 
-        printing = False
-        pathFound = False
+        heapq.heappush(open, (0, next(counter), startIndex))
+
+        if stats is not None:
+            stats.pushes += 1
+            searchStart = time.perf_counter()
+            stats.add_time('setup', searchStart - phaseStart)
+
+        goalIndex = None
         nodesExpanded = 0
+        xmin, xmax, ymin, ymax = self.map.xmin, self.map.xmax, self.map.ymin, self.map.ymax
+
+        while open and goalIndex is None:
+            f, _, nodeIndex = heapq.heappop(open)
+            x, y, theta, g = float(nodes.x[nodeIndex]), float(nodes.y[nodeIndex]), float(nodes.theta[nodeIndex]), float(nodes.g[nodeIndex])
+            prevAction = int(nodes.action[nodeIndex])
+            cell = self.discretize(x, y, theta)
+            if keyActions:
+                cell += (prevAction,)
+            switchRow = startCosts if nodeIndex == startIndex else switchCosts[prevAction]
 
-        while not open.empty() and not pathFound:
-            currentNode = open.get()[1]
-            openList[currentNode.x_g, currentNode.y_g, currentNode.theta_g] = 999999
+            if self.stopCondition is not None and nodesExpanded % 256 == 0 and self.stopCondition():
+                print("Search stopped")
+                break
+
+            openList.pop(cell, None)
             nodesExpanded += 1
+            if stats is not None:
+                stats.expanded(len(open), x, y, theta, g, f)
 
             if self.simulate:
-                pathHistory.append(currentNode)
-
-            if printing:
-                print(f"Currently exploring (x:{currentNode.x:.2f}, y: {currentNode.y:.2f}, " +
-                    f"theta: {currentNode.theta*180/np.pi:.2f}), Action {currentNode.prevAction} from (" +
-                    f"x: {currentNode.parent.x:.2f}, y: {currentNode.parent.y:.2f}, " +
-                    f"theta: {currentNode.parent.theta*180/np.pi:.2f}), f = {currentNode.f:.2f}, " + 
-                    f"g = {currentNode.g:.2f}, h = {currentNode.h:.2f}")
-            
-            printing = False
+                pathHistory.append(nodeIndex)
+
+            if self.analyticExpansion and self.goals is not None:
+                # shoot at the nearest goal
+                shotGoal = int(np.argmin(np.hypot(self.goals[:, 0] - x, self.goals[:, 1] - y)))
+                self.x_f, self.y_f, self.theta_f = self.goals[shotGoal].tolist()
+
+            if self.analyticExpansion and (nodesExpanded % self.shotInterval == 0 or 
+                                           utils.l2(x, y, self.x_f, self.y_f) <= self.shotRadius):
+                if stats is not None:
+                    shotStart = time.perf_counter()
+                shot = self.shoot_to_goal(x, y, theta, choices)
+                if stats is not None:
+                    stats.add_time('shots', time.perf_counter() - shotStart)
+                if shot is not None:
+                    print("Path Found!")
+                    self.goalReached = shotGoal if self.goals is not None else 0
+                    goalIndex = nodeIndex
+                    for i, x_child, y_child, theta_child in shot:
+                        g += stepCosts[i] + switchRow[i]
+                        switchRow = switchCosts[i]
+                        goalIndex = nodes.add(x_child, y_child, theta_child, g, g, goalIndex, i)
+                    break
+
+            cos_t = math.cos(theta)
+            sin_t = math.sin(theta)
 
-            for choice in choices:
-                if choice[0] == -currentNode.prevAction[0] and choice[1] == -currentNode.prevAction[1]:
+            if self.map.footprint:
+                # footprint along every primitive checked in a single lookup
+                blocked = self.map.collide_with_poses(x + sweep_x*cos_t - sweep_y*sin_t,
+                                                      y + sweep_x*sin_t + sweep_y*cos_t,
+                                                      theta + sweep_theta).any(axis=1).tolist()
+
+            children = []
+            for i, (choice, dx, dy, dtheta, cos_d, sin_d) in enumerate(primitives):
+                if i == opposite[prevAction]:
                     continue 
 
-                x_child, y_child, theta_child = self.calculate_next_node(currentNode, choice)
+                if self.map.footprint and blocked[i]:
+                    if stats is not None:
+                        stats.collisionRejects += 1
+                    continue
 
-                if self.map.collide_with_point(x_child + c.REAR_AXLE_TO_CENTER*np.cos(theta_child), y_child + c.REAR_AXLE_TO_CENTER*np.sin(theta_child)):
-                    continue #skip if next node is occupied
+                x_child = x + dx*cos_t - dy*sin_t
+                y_child = y + dx*sin_t + dy*cos_t
+                theta_child = utils.normalise_theta(theta + dtheta) if dtheta else theta
 
-                childNode = Node(x_child, y_child, theta_child, prevAction=choice, parent=currentNode)
+                # heading of child from angle addition, avoids another cos/sin per child
+                cos_child = cos_t*cos_d - sin_t*sin_d
+                sin_child = sin_t*cos_d + cos_t*sin_d
 
-                if endNode == childNode:
+                if not self.map.footprint and \
+                    self.map.collide_with_point(x_child + c.REAR_AXLE_TO_CENTER*cos_child, y_child + c.REAR_AXLE_TO_CENTER*sin_child):
+                    if stats is not None:
+                        stats.collisionRejects += 1
+                    continue #skip if next node is occupied
+
+                self.goalReached = self.match_goal(x_child, y_child, theta_child)
+                if self.goalReached is not None:
                     print("Path Found!")
-                    pathFound = True
-                    currentNode = childNode
+                    g_child = g + stepCosts[i] + switchRow[i]
+                    goalIndex = nodes.add(x_child, y_child, theta_child, g_child, g_child, nodeIndex, i)
                     break
-                
-                else:
-                    childNode.g = currentNode.g + self.L
-                    if self.heuristic == 'euclidean':
-                        childNode.h = utils.l2(childNode.x, childNode.y, endNode.x, endNode.y)
-                    elif self.heuristic == 'manhattan':
-                        childNode.h = utils.l1(childNode.x, childNode.y, endNode.x, endNode.y)
-                    elif self.heuristic == 'diag':
-                        childNode.h = utils.diag_dist(childNode.x, childNode.y, endNode.x, endNode.y)
-                    elif self.heuristic == 'reeds-shepp':
-                        childNode.h = rs.get_optimal_path_length((childNode.x, childNode.y, childNode.theta), 
-                                                    (endNode.x, endNode.y, endNode.theta), self.minR)
-                    elif self.heuristic == 'hybridl2':
-                        childNode.h = max(utils.l2(childNode.x, childNode.y, endNode.x, endNode.y), 
-                                          rs.get_optimal_path_length((childNode.x, childNode.y, childNode.theta), 
-                                                    (endNode.x, endNode.y, endNode.theta), self.minR))
-                    elif self.heuristic == 'hybridl1':
-                        childNode.h = min(utils.l1(childNode.x, childNode.y, endNode.x, endNode.y), 
-                                          rs.get_optimal_path_length((childNode.x, childNode.y, childNode.theta), 
-                                                    (endNode.x, endNode.y, endNode.theta), self.minR))
-                    elif self.heuristic == 'hybriddiag':
-                        childNode.h = min(utils.diag_dist(childNode.x, childNode.y, endNode.x, endNode.y), 
-                                          rs.get_optimal_path_length((childNode.x, childNode.y, childNode.theta), 
-                                                    (endNode.x, endNode.y, endNode.theta), self.minR))
-                    elif self.heuristic == 'greedy':
-                        childNode.h = 0
-
-                    extraCost = 0
-                    extraCost += self.gearChangeCost*abs(currentNode.prevAction[0] - choice[0])
-                    extraCost += self.steeringChangeCost*abs(currentNode.prevAction[1] - choice[1])
-                    
-                    childNode.f = childNode.g + childNode.h + extraCost
-
-                if childNode.x_g < 0 or childNode.x_g >= 40 or \
-                    childNode.y_g < 0 or childNode.y_g >= 40 or \
-                    openList[childNode.x_g, childNode.y_g, childNode.theta_g] < childNode.f:
-                    continue
 
-                if childNode.x_g < 0 or childNode.x_g >= 40 or \
-                    childNode.y_g < 0 or childNode.y_g >= 40 or \
-                    closedList[childNode.x_g, childNode.y_g, childNode.theta_g] < childNode.f:
+                children.append((i, x_child, y_child, theta_child))
+
+            if goalIndex is not None:
+                break
+
+            # heuristic for all children at once so Reeds-Shepp lengths are evaluated in one batch
+            if stats is not None:
+                heuristicStart = time.perf_counter()
+            h_children = self.heuristic_costs([child[1:] for child in children])
+            if stats is not None:
+                stats.add_time('heuristic', time.perf_counter() - heuristicStart)
+
+            for (i, x_child, y_child, theta_child), h_child in zip(children, h_children):
+                g_child = g + stepCosts[i] + switchRow[i]
+                if g_child + hScale*h_child >= self.upperBound:
+                    if stats is not None:
+                        stats.boundPruned += 1
+                    continue # cannot improve on the best path so far
+
+                f_child = g_child + self.weight*hScale*h_child + extraCosts[prevAction][i]
+                childCell = self.discretize(x_child, y_child, theta_child)
+                if keyActions:
+                    childCell += (i,)
+
+                if not (xmin <= x_child < xmax and ymin <= y_child < ymax) or \
+                    openList.get(childCell, math.inf) < f_child or \
+                    closedList.get(childCell, math.inf) < f_child:
+                    if stats is not None:
+                        stats.dominated += 1
                     continue
                 
-                open.put((childNode.f, childNode))
-                openList[childNode.x_g, childNode.y_g, childNode.theta_g] = childNode.f
+                heapq.heappush(open, (f_child, next(counter), nodes.add(x_child, y_child, theta_child, g_child, f_child, nodeIndex, i)))
+                if stats is not None:
+                    stats.pushes += 1
+                openList[childCell] = f_child
             
-            close.put((currentNode.f, currentNode))
-            closedList[currentNode.x_g, currentNode.y_g, currentNode.theta_g] = currentNode.f
+            closedList[cell] = f
 
-        if pathFound:
-            path = []
-            while currentNode != startNode:
-                path.append(currentNode)
-                currentNode = currentNode.parent
+        if stats is not None:
+            phaseStart = time.perf_counter()
+            stats.add_time('search', phaseStart - searchStart)
 
-            path.reverse()
+        if goalIndex is not None:
+            path = nodes.reconstruct_path(goalIndex, choices)
+            if self.goals is not None:
+                self.x_f, self.y_f, self.theta_f = self.goals[self.goalReached].tolist()
         
         else:
             path = None
 
+        if stats is not None:
+            stats.add_time('reconstruct', time.perf_counter() - phaseStart)
+
         end = time.process_time()
         print(f"Nodes Expanded = {nodesExpanded}, Time taken = {(end - start):.2f}")
+        self.nodesExpanded = nodesExpanded
 
         if self.simulate:
-            return path, pathHistory
+            return path, nodes.to_nodes(pathHistory, choices)
         
         else:
             return path, None
 
+    def find_path_anytime(self, time_budget_s: float, weights: List[float]=[3, 2, 1.5, 1.25, 1]):
+        """Anytime search within a wall clock budget
+
+        Runs weighted searches with decreasing weights, each pruned by the cost of the best
+        path so far, until the budget runs out or the unweighted search completes. The path of a
+        completed search with weight w costs at most w times the path of the unweighted
+        search, so the weight of the last completed search bounds the best path.
+
+        Args:
+            time_budget_s (float): wall clock budget in seconds
+            weights (List[float], optional): heuristic weights to search with, in order. Defaults to [3, 2, 1.5, 1.25, 1].
+
+        Returns:
+            (List[Node], float): best path found (None if none) and its suboptimality bound (inf if unknown)
+        """
+        deadline = time.perf_counter() + time_budget_s
+        stopCondition = self.stopCondition
+        self.stopCondition = lambda: time.perf_counter() >= deadline or (stopCondition is not None and stopCondition())
+
+        path = bestPath = None
+        bound = math.inf
+        goal = (self.x_f, self.y_f, self.theta_f, self.goalReached)
+        for weight in weights:
+            self.weight = weight
+            path, _ = self.find_path()
+
+            if time.perf_counter() >= deadline:
+                break # interrupted, a path found just before the deadline is still kept below
+            
+            bound = weight
+            if path is not None and (bestPath is None or self.path_cost(path) < self.path_cost(bestPath)):
+                bestPath = path
+                goal = (self.x_f, self.y_f, self.theta_f, self.goalReached)
+                self.upperBound = self.path_cost(path)
+
+        if path is not None and (bestPath is None or self.path_cost(path) < self.path_cost(bestPath)):
+            bestPath = path
+            goal = (self.x_f, self.y_f, self.theta_f, self.goalReached)
+
+        print(f"Best path cost = {self.path_cost(bestPath) if bestPath else math.inf:.1f}, bound = {bound}")
+        self.x_f, self.y_f, self.theta_f, self.goalReached = goal
+        self.stopCondition = stopCondition
+        self.weight = 1
+        self.upperBound = math.inf
+
+        return bestPath, bound
+
+    def find_path_bidirectional(self):
+        """Search forward from the start and backward from the goal until the frontiers meet
+
+        The backward search expands predecessors, the poses that reach a node by driving one motion primitive.
+        The side with the smaller open set is expanded next. When a node is expanded in a cell the other side
+        has already expanded, with poses within the goal tolerance of each other, the actions of the backward
+        half are replayed from the forward node. The replay is collision checked and must end within the goal
+        tolerance, so the spliced path is exactly what the commands from construct_path_2 drive. Analytic
+        expansion is not used in this mode.
+
+        Returns:
+            (List[Node], List[Node]): path (start excluded) and expanded nodes of both sides if simulating,
+                (None, ...) if not found
+        """
+        start = time.process_time()
+        stats = self.stats
+        if stats is not None:
+            stats.searches += 1
+        pathHistory = []
+        primitives = motion_primitives(self.L, self.minR)
+        if self.map.footprint:
+            sweep_x, sweep_y, sweep_theta = primitive_sweeps(self.L, self.minR)
+
+        choices = [choice for choice, _, _, _, _, _ in primitives]
+        opposite = [choices.index((-gear, -steering)) for gear, steering in choices]
+        stepCosts, switchCosts, startCosts, extraCosts, hScale = self.cost_terms(choices)
+        straight = choices.index((Gear.FORWARD, Steering.STRAIGHT))
+        # with a cost model the cost to go also depends on the last action (whether the next step starts a
+        # new command), so the action is part of the visited state
+        keyActions = self.costModel is not None
+
+        # per side: node pool, open set, best open and closed f of each visited state (see keyActions), last node
+        # expanded in each cell
+        sides = []
+        for x, y, theta in [(self.x, self.y, self.theta), (self.x_f, self.y_f, self.theta_f)]:
+            nodes = NodePool()
+            root = nodes.add(x, y, theta, 0, 0, -1, straight)
+            sides.append({'nodes': nodes, 'open': [(0, 0, root)], 'openList': {}, 'closedList': {}, 'expanded': {}})
+        forward, backward = sides
+        forward['target'], forward['distanceField'] = (self.x_f, self.y_f, self.theta_f), self.distanceField
+        backward['target'], backward['distanceField'] = (self.x, self.y, self.theta), self.startDistanceField
+        counter = itertools.count(1)
+
+        path = None
+        meeting = None
+        nodesExpanded = 0
+        xmin, xmax, ymin, ymax = self.map.xmin, self.map.xmax, self.map.ymin, self.map.ymax
+
+        while (forward['open'] or backward['open']) and meeting is None:
+            isForward = not backward['open'] or (forward['open'] and len(forward['open']) <= len(backward['open']))
+            side, other = (forward, backward) if isForward else (backward, forward)
+            nodes = side['nodes']
+
+            f, _, nodeIndex = heapq.heappop(side['open'])
+            x, y, theta, g = float(nodes.x[nodeIndex]), float(nodes.y[nodeIndex]), float(nodes.theta[nodeIndex]), float(nodes.g[nodeIndex])
+            action = int(nodes.action[nodeIndex])
+            cell = self.discretize(x, y, theta)
+            state = cell + (action,) if keyActions else cell
+
+            if self.stopCondition is not None and nodesExpanded % 256 == 0 and self.stopCondition():
+                print("Search stopped")
+                break
+
+            side['openList'].pop(state, None)
+            side['expanded'][cell] = nodeIndex
+            nodesExpanded += 1
+            if stats is not None:
+                stats.expanded(len(side['open']), x, y, theta, g, f)
+            if self.simulate:
+                pathHistory.append((isForward, nodeIndex))
+
+            # meet the other side in this cell
+            otherIndex = other['expanded'].get(cell)
+            if otherIndex is not None:
+                forwardIndex, backwardIndex = (nodeIndex, otherIndex) if isForward else (otherIndex, nodeIndex)
+                path = self.splice(forwardIndex, backwardIndex, forward['nodes'], backward['nodes'], choices)
+                if path is not None:
+                    print("Path Found!")
+                    meeting = cell
+                    break
+
+            cos_t = math.cos(theta)
+            sin_t = math.sin(theta)
+            isRoot = nodes.parent[nodeIndex] == -1
+
+            poses = []
+            for i, (choice, dx, dy, dtheta, cos_d, sin_d) in enumerate(primitives):
+                if isForward:
+                    # child reached by driving i from this node
+                    cos_child = cos_t*cos_d - sin_t*sin_d
+                    sin_child = sin_t*cos_d + cos_t*sin_d
+                    poses.append((x + dx*cos_t - dy*sin_t, y + dx*sin_t + dy*cos_t, theta + dtheta, cos_child, sin_child))
+                else:
+                    # child reaches this node by driving i
+                    cos_child = cos_t*cos_d + sin_t*sin_d
+                    sin_child = sin_t*cos_d - cos_t*sin_d
+                    poses.append((x - dx*cos_child + dy*sin_child, y - dx*sin_child - dy*cos_child, theta - dtheta, cos_child, sin_child))
+
+            if self.map.footprint:
+                # sweeps start from this node going forward, from each child going backward
+                if isForward:
+                    origins = np.array([[x, y, theta, cos_t, sin_t]])
+                else:
+                    origins = np.array(poses)
+                origin_x, origin_y, origin_theta, origin_cos, origin_sin = [origins[:, j:j+1] for j in range(5)]
+                blocked = self.map.collide_with_poses(origin_x + sweep_x*origin_cos - sweep_y*origin_sin,
+                                                      origin_y + sweep_x*origin_sin + sweep_y*origin_cos,
+                                                      origin_theta + sweep_theta).any(axis=1).tolist()
+
+            children = []
+            for i, (x_child, y_child, theta_child, cos_child, sin_child) in enumerate(poses):
+                if not (isRoot and not isForward) and i == opposite[action]:
+                    continue
+
+                theta_child = utils.normalise_theta(theta_child) if primitives[i][3] else theta
+
+                if self.map.footprint:
+                    collision = blocked[i]
+                else:
+                    collision = self.map.collide_with_point(x_child + c.REAR_AXLE_TO_CENTER*cos_child, 
+                                                            y_child + c.REAR_AXLE_TO_CENTER*sin_child)
+                if collision:
+                    if stats is not None:
+                        stats.collisionRejects += 1
+                    continue
+
+                # in driving order the forward child takes i after action, the backward child takes i before it
+                if isRoot:
+                    extraCost, switchCost = 0, startCosts[i] if isForward else 0
+                else:
+                    extraCost = extraCosts[action][i] if isForward else extraCosts[i][action]
+                    switchCost = switchCosts[action][i] if isForward else switchCosts[i][action]
+                children.append((i, x_child, y_child, theta_child, extraCost, g + stepCosts[i] + switchCost))
+
+            h_children = self.heuristic_costs([child[1:4] for child in children], side['target'], side['distanceField'])
+
+            for (i, x_child, y_child, theta_child, extraCost, g_child), h_child in zip(children, h_children):
+                if g_child + hScale*h_child >= self.upperBound:
+                    if stats is not None:
+                        stats.boundPruned += 1
+                    continue
+
+                f_child = g_child + self.weight*hScale*h_child + extraCost
+                childCell = self.discretize(x_child, y_child, theta_child)
+                if keyActions:
+                    childCell += (i,)
+
+                if not (xmin <= x_child < xmax and ymin <= y_child < ymax) or \
+                    side['openList'].get(childCell, math.inf) < f_child or \
+                    side['closedList'].get(childCell, math.inf) < f_child:
+                    if stats is not None:
+                        stats.dominated += 1
+                    continue
+
+                heapq.heappush(side['open'], (f_child, next(counter), nodes.add(x_child, y_child, theta_child, g_child, f_child, nodeIndex, i)))
+                side['openList'][childCell] = f_child
+                if stats is not None:
+                    stats.pushes += 1
+
+            side['closedList'][state] = f
+
+        if path is not None:
+            self.goalReached = 0
+
+        end = time.process_time()
+        print(f"Nodes Expanded = {nodesExpanded}, Time taken = {(end - start):.2f}")
+        self.nodesExpanded = nodesExpanded
+
+        if self.simulate:
+            history = [index for isForward, index in pathHistory if isForward]
+            backwardHistory = [index for isForward, index in pathHistory if not isForward]
+            return path, forward['nodes'].to_nodes(history, choices) + backward['nodes'].to_nodes(backwardHistory, choices)
+
+        else:
+            return path, None
+
+    def splice(self, forwardIndex: int, backwardIndex: int, forwardNodes: NodePool, backwardNodes: NodePool, 
+               choices) -> List[Node]:
+        """Join a forward and a backward node expanded in the same cell into a path to the goal
+
+        The actions from the backward node to the goal are replayed from the forward node, checking collisions
+        the same way as the search.
+
+        Returns:
+            List[Node]: path (start excluded), None if the poses are not within the goal tolerance of each other,
+                the replay collides or does not end within the goal tolerance, or both nodes are the roots
+                (start already within the goal tolerance), so the search goes on as find_path does
+        """
+        x, y, theta = float(forwardNodes.x[forwardIndex]), float(forwardNodes.y[forwardIndex]), float(forwardNodes.theta[forwardIndex])
+        x_b, y_b, theta_b = float(backwardNodes.x[backwardIndex]), float(backwardNodes.y[backwardIndex]), float(backwardNodes.theta[backwardIndex])
+        if not within_goal_tolerance((x, y, theta), (x_b, y_b, theta_b)):
+            return None
+
+        actions = []
+        index = backwardIndex
+        while backwardNodes.parent[index] != -1:
+            actions.append(int(backwardNodes.action[index]))
+            index = int(backwardNodes.parent[index])
+
+        steps = drive_primitives(self.map, self.L, self.minR, (x, y, theta), actions)
+        if steps is None:
+            return None
+
+        end = steps[-1][1:] if steps else (x, y, theta)
+        if not self.at_goal(*end) or not steps and forwardNodes.parent[forwardIndex] == -1:
+            return None
+
+        path = forwardNodes.reconstruct_path(forwardIndex, choices)
+        prev = path[-1] if path else forwardNodes.to_nodes([forwardIndex], choices)[0]
+        for i, x, y, theta in steps:
+            node = Node(x, y, theta, choices[i], parent=prev)
+            if self.costModel is None:
+                node.g = prev.g + self.L
+            else:
+                node.g = prev.g + self.costModel.step_cost(choices[i], self.L, self.minR) + \
+                    self.costModel.switch_cost(prev.prevAction, choices[i])
+            path.append(node)
+            prev = node
+
+        return path
+
+    def cost_terms(self, choices):
+        """Costs of the motion primitives, in cm without a costModel and in seconds with one
+
+        Returns:
+            (list, list, list, list, float): g of driving each primitive, g of starting primitive j after i
+                (switchCosts[i][j]), g of each primitive taken from the start, f of taking primitive j after i
+                (steeringChangeCost and gearChangeCost, not added to g), and the heuristic scale
+        """
+        if self.costModel is None:
+            extraCosts = [[self.gearChangeCost*abs(prev[0] - choice[0]) + self.steeringChangeCost*abs(prev[1] - choice[1]) 
+                           for choice in choices] for prev in choices]
+            return [self.L]*len(choices), [[0]*len(choices) for _ in choices], [0]*len(choices), extraCosts, 1
+
+        model = self.costModel
+        return ([model.step_cost(choice, self.L, self.minR) for choice in choices],
+                [[model.switch_cost(prev, choice) for choice in choices] for prev in choices],
+                [model.commandOverhead]*len(choices), [[0]*len(choices) for _ in choices], model.seconds_per_cm(self.minR))
+
+    def path_cost(self, path: List[Node]) -> float:
+        """Length of a path in cm, or its estimated execution time in seconds with a costModel
+        """
+        if self.costModel is None:
+            return len(path)*self.L
+
+        return self.costModel.path_seconds([node.prevAction for node in path], self.L, self.minR)
+
+    def shoot_to_goal(self, x: float, y: float, theta: float, choices):
+        """Follow Reeds-Shepp paths to the goal with the motion primitives, shortest first
+
+        Segments are rounded to whole primitive steps so construct_path_2 can count them, paths
+        whose rounded end misses the goal tolerance or that collide are rejected.
+
+        Args:
+            x (float): x coordinate of rear axle
+            y (float): y coordinate of rear axle
+            theta (float): direction
+            choices (list): (gear, steering) of every primitive
+
+        Returns:
+            list: (primitive index, x, y, theta) of every step to the goal, None if no path reaches it
+        """
+        for rsPath in rs.get_sorted_paths((x, y, theta), (self.x_f, self.y_f, self.theta_f), self.minR)[:4]:
+            actions = []
+            for element in rsPath:
+                actions += [choices.index((element.gear, element.steering))]*round(element.param/self.L)
+
+            steps = drive_primitives(self.map, self.L, self.minR, (x, y, theta), actions)
+            if steps and self.at_goal(*steps[-1][1:]):
+                return steps
+
+        return None
+
+    def discretize(self, x: float, y: float, theta: float):
+        """Lattice cell and heading bin of a pose, see Node.discretize_position
+        """
+        return int(x // self.cellSize), int(y // self.cellSize), int(((theta * 180 / np.pi + 180)//(360/self.thetaBins)))
+
+    def at_goal(self, x: float, y: float, theta: float) -> bool:
+        """Whether a pose is within the goal tolerance, same as comparing Nodes
+        """
+        return within_goal_tolerance((x, y, theta), (self.x_f, self.y_f, self.theta_f))
+
+    def build_goal_hash(self) -> dict:
+        """Index goals by every (grid cell, heading bin) a pose within the goal tolerance of them can fall in
+
+        Returns:
+            dict: (x_g, y_g, theta_g) -> indices of goals, in preference order
+        """
+        goalHash = {}
+        cellSize = self.cellSize
+        # heading samples closer than a bin apart so every bin within the tolerance is covered
+        dthetas = np.linspace(-GOAL_TOLERANCE_THETA, GOAL_TOLERANCE_THETA, int(np.ceil(self.thetaBins/24)) + 2)
+        for index, (x, y, theta) in enumerate(self.goals.tolist()):
+            keys = set()
+            for x_g in range(int((x - GOAL_TOLERANCE_XY)//cellSize), int((x + GOAL_TOLERANCE_XY)//cellSize) + 1):
+                for y_g in range(int((y - GOAL_TOLERANCE_XY)//cellSize), int((y + GOAL_TOLERANCE_XY)//cellSize) + 1):
+                    for dtheta in dthetas:
+                        keys.add((x_g, y_g, self.discretize(x, y, utils.normalise_theta(theta + dtheta))[2]))
+
+            for key in keys:
+                goalHash.setdefault(key, []).append(index)
+
+        return goalHash
+
+    def match_goal(self, x: float, y: float, theta: float):
+        """Goal a pose is within the tolerance of
+
+        Returns:
+            int: index of the most preferred goal matched (0 in single goal mode), None if none
+        """
+        if self.goals is None:
+            return 0 if self.at_goal(x, y, theta) else None
+
+        for index in self.goalHash.get(self.discretize(x, y, theta), []):
+            if within_goal_tolerance((x, y, theta), self.goals[index]):
+                return index
+
+        return None
+
+    def heuristic_costs(self, poses, goal: tuple=None, distanceField: np.ndarray=None) -> List[float]:
+        """Estimated costs from poses to the goal using the configured heuristic
+
+        Args:
+            poses (list): (x, y, theta) poses
+            goal (tuple, optional): (x, y, theta) pose to estimate costs to instead of the goal, e.g. the start
+                for the backward search of bidirectional mode. Defaults to None.
+            distanceField (np.ndarray, optional): grid distances to goal for 'rs-grid'. Defaults to self.distanceField.
+
+        Returns:
+            List[float]: estimated cost of each pose
+        """
+        if not poses:
+            return []
+
+        if self.goals is not None and goal is None:
+            return self.multi_goal_heuristic_costs(poses)
+
+        if goal is None:
+            goal = (self.x_f, self.y_f, self.theta_f)
+        x_f, y_f, _ = goal
+
+        if self.heuristic in ['reeds-shepp', 'hybridl2', 'hybridl1', 'hybriddiag', 'rs-grid']:
+            rs_lengths = rs.get_optimal_path_lengths(poses, goal, self.minR).tolist()
+
+        if self.heuristic == 'euclidean':
+            return [utils.l2(x, y, x_f, y_f) for x, y, _ in poses]
+        elif self.heuristic == 'manhattan':
+            return [utils.l1(x, y, x_f, y_f) for x, y, _ in poses]
+        elif self.heuristic == 'diag':
+            return [utils.diag_dist(x, y, x_f, y_f) for x, y, _ in poses]
+        elif self.heuristic == 'reeds-shepp':
+            return rs_lengths
+        elif self.heuristic == 'hybridl2':
+            return [max(utils.l2(x, y, x_f, y_f), rs_length) for (x, y, _), rs_length in zip(poses, rs_lengths)]
+        elif self.heuristic == 'hybridl1':
+            return [min(utils.l1(x, y, x_f, y_f), rs_length) for (x, y, _), rs_length in zip(poses, rs_lengths)]
+        elif self.heuristic == 'hybriddiag':
+            return [min(utils.diag_dist(x, y, x_f, y_f), rs_length) for (x, y, _), rs_length in zip(poses, rs_lengths)]
+        elif self.heuristic == 'rs-table':
+            return self.rsTable.get_lengths(poses, goal).tolist()
+        elif self.heuristic == 'rs-grid':
+            return np.maximum(rs_lengths, self.grid_distances(poses, distanceField)).tolist()
+        elif self.heuristic == 'greedy':
+            return [0]*len(poses)
+
+    def multi_goal_heuristic_costs(self, poses) -> List[float]:
+        """Estimated costs from poses to the nearest of the goals, every pose and goal pair in one batch
+
+        Args:
+            poses (list): (x, y, theta) poses
+
+        Returns:
+            List[float]: estimated cost of each pose
+        """
+        poses = np.asarray(poses, dtype=float)
+        starts = np.repeat(poses, len(self.goals), axis=0)
+        ends = np.tile(self.goals, (len(poses), 1))
+        dx = np.abs(starts[:, 0] - ends[:, 0])
+        dy = np.abs(starts[:, 1] - ends[:, 1])
+
+        if self.heuristic in ['reeds-shepp', 'hybridl2', 'hybridl1', 'hybriddiag', 'rs-grid']:
+            rs_lengths = rs.get_optimal_path_lengths(starts, ends, self.minR)
+
+        if self.heuristic == 'euclidean':
+            costs = np.hypot(dx, dy)
+        elif self.heuristic == 'manhattan':
+            costs = dx + dy
+        elif self.heuristic == 'diag':
+            costs = np.sqrt(2)*np.minimum(dx, dy) + np.abs(dx - dy)
+        elif self.heuristic in ['reeds-shepp', 'rs-grid']:
+            costs = rs_lengths
+        elif self.heuristic == 'hybridl2':
+            costs = np.maximum(np.hypot(dx, dy), rs_lengths)
+        elif self.heuristic == 'hybridl1':
+            costs = np.minimum(dx + dy, rs_lengths)
+        elif self.heuristic == 'hybriddiag':
+            costs = np.minimum(np.sqrt(2)*np.minimum(dx, dy) + np.abs(dx - dy), rs_lengths)
+        elif self.heuristic == 'rs-table':
+            costs = self.rsTable.get_lengths(starts, ends)
+        elif self.heuristic == 'greedy':
+            costs = np.zeros(len(starts))
+
+        costs = costs.reshape(len(poses), len(self.goals)).min(axis=1)
+        if self.heuristic == 'rs-grid':
+            costs = np.maximum(costs, self.grid_distances(poses))
+
+        return costs.tolist()
+
+    def grid_distances(self, poses, distanceField: np.ndarray=None) -> np.ndarray:
+        """Obstacle-aware distances of the car centers to the goal, looked up in the goal distance field
+
+        Args:
+            poses (list): (x, y, theta) poses of rear axle
+            distanceField (np.ndarray, optional): distance field to look up. Defaults to self.distanceField.
+
+        Returns:
+            np.ndarray: distance of each pose, 0 where the goal is unreachable on the grid
+        """
+        poses = np.asarray(poses, dtype=float)
+        cellSize = 200/c.GRID_SIZE
+        x_g = np.floor_divide(poses[:, 0] + c.REAR_AXLE_TO_CENTER*np.cos(poses[:, 2]), cellSize).astype(int)
+        y_g = np.floor_divide(poses[:, 1] + c.REAR_AXLE_TO_CENTER*np.sin(poses[:, 2]), cellSize).astype(int)
+
+        if distanceField is None:
+            distanceField = self.distanceField
+        distances = distanceField[np.clip(x_g, 0, c.GRID_SIZE - 1), np.clip(y_g, 0, c.GRID_SIZE - 1)]
+        return np.where(np.isinf(distances), 0, distances)
+
     def checkPathFound(self, curNode, thetaMargin:float=np.pi/12, targetDistance:float=21, distanceMargin: float=7.5, maxPerpDistance:float=0.5):
         if abs(curNode.theta - self.theta_f) > thetaMargin:
             return False
@@ -243,26 +1044,16 @@ class HybridAStar():
         return True
 
     def calculate_next_node(self, currentNode, choice):
-        gear = choice[0]
-        steering = choice[1]
+        for primitiveChoice, dx, dy, dtheta, _, _ in motion_primitives(self.L, self.minR):
+            if primitiveChoice == tuple(choice):
+                break
 
-        if steering == Steering.STRAIGHT:
-            x_b = currentNode.x + gear * self.L * math.cos(currentNode.theta)
-            y_b = currentNode.y + gear * self.L * math.sin(currentNode.theta)
-            theta_b = currentNode.theta
-
-        else:
-            x_c = currentNode.x + steering*self.minR*math.sin(currentNode.theta)
-            y_c = currentNode.y - steering*self.minR*math.cos(currentNode.theta)
+        cos_t = math.cos(currentNode.theta)
+        sin_t = math.sin(currentNode.theta)
 
-            theta_t = -steering*self.L/self.minR
-            theta_b = utils.normalise_theta(currentNode.theta + gear*theta_t)
-
-            x_ca = currentNode.x - x_c
-            y_ca = currentNode.y - y_c
-
-            x_b = x_c + (x_ca * math.cos(gear*theta_t) - y_ca * math.sin(gear*theta_t))
-            y_b = y_c + (x_ca * math.sin(gear*theta_t) + y_ca * math.cos(gear*theta_t))
+        x_b = currentNode.x + dx*cos_t - dy*sin_t
+        y_b = currentNode.y + dx*sin_t + dy*cos_t
+        theta_b = utils.normalise_theta(currentNode.theta + dtheta) if dtheta else currentNode.theta
 
         return x_b, y_b, theta_b
         
@@ -273,11 +1064,18 @@ if __name__ == '__main__':
 
     algo = HybridAStar(map, x_f=150, y_f=150, theta_f=np.pi, gearChangeCost=10, steeringChangeCost=10, 
                            L=5, heuristic='greedy')
-    path = algo.find_path()
+    path, _ = algo.find_path()
     for node in path:
         print(f"Current Node (x:{node.x:.2f}, y: {node.y:.2f}, " +
                 f"theta: {node.theta*180/np.pi:.2f}), Action: {node.prevAction}")
 
+    # start already within the goal tolerance, both searches drive away and back rather than return an empty path
+    for bidirectional in (False, True):
+        algo = HybridAStar(map, 150, 150, np.pi, x_f=150, y_f=150, theta_f=np.pi, gearChangeCost=10, steeringChangeCost=10,
+                           L=5, heuristic='euclidean', bidirectional=bidirectional)
+        path, _ = algo.find_path()
+        assert path and algo.at_goal(path[-1].x, path[-1].y, path[-1].theta), f"start == goal, bidirectional={bidirectional}"
+
 
     '''
     theta_grid = np.linspace(-np.pi, np.pi, 3600)
@@ -0,0 +1,102 @@
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__ + '\..')))
+
+from objects.OccupancyMap import OccupancyMap
+from pathfinding.hybrid_astar import Node, motion_primitives, drive_primitives, within_goal_tolerance
+import pathfinding.reeds_shepp as rs
+from typing import List
+
+class PathSmoother():
+    def __init__(self, map: OccupancyMap, L: float, minR: float, candidates: int=4) -> None:
+        """Shortcut smoothing of HybridAStar paths, run before construct_path_2
+
+        Sub-paths between command boundaries are replaced by Reeds-Shepp paths rounded to whole primitive
+        steps whenever that leaves fewer commands (or as many commands but fewer steps). After each shortcut
+        the rest of the path is driven again from where the shortcut ends and must stay collision free and
+        end within the goal tolerance, so the smoothed path is exactly what its commands drive.
+
+        Args:
+            map (OccupancyMap): map the path was planned on, collisions are checked the same way as HybridAStar
+            L (float): distance travelled each step in cm
+            minR (float): minimum turning radius in cm
+            candidates (int, optional): shortest Reeds-Shepp paths tried for each shortcut. Defaults to 4.
+        """
+        self.map = map
+        self.L = L
+        self.minR = minR
+        self.candidates = candidates
+        self.choices = [choice for choice, _, _, _, _, _ in motion_primitives(L, minR)]
+
+    def smooth(self, path: List[Node], goal: tuple) -> List[Node]:
+        """Shortcut a path
+
+        Args:
+            path (List[Node]): HybridAStar path (start excluded), path[0].parent is the start
+            goal (tuple): (x, y, theta) goal the path was planned to
+
+        Returns:
+            List[Node]: smoothed path (start excluded), the path itself if nothing could be shortcut
+        """
+        start = path[0].parent
+        poses = [(start.x, start.y, start.theta)] + [(node.x, node.y, node.theta) for node in path]
+        actions = [self.choices.index(node.prevAction) for node in path]
+        changed = False
+
+        i = 0
+        while i < len(actions):
+            boundaries = [k for k in range(i + 2, len(actions)) if actions[k] != actions[k - 1]] + [len(actions)]
+            for j in reversed(boundaries):
+                steps = self.shortcut(actions, poses, i, j, goal)
+                if steps is not None:
+                    actions = actions[:i] + [step[0] for step in steps]
+                    poses = poses[:i + 1] + [step[1:] for step in steps]
+                    changed = True
+                    break
+
+            # next command boundary
+            i += 1
+            while 0 < i < len(actions) and actions[i] == actions[i - 1]:
+                i += 1
+
+        if not changed:
+            return path
+
+        print(f"Smoothed path from {count_commands([self.choices.index(node.prevAction) for node in path])} " +
+              f"to {count_commands(actions)} commands")
+        smoothed = []
+        prev = start
+        for i, (x, y, theta) in zip(actions, poses[1:]):
+            node = Node(x, y, theta, self.choices[i], parent=prev)
+            node.g = prev.g + self.L
+            smoothed.append(node)
+            prev = node
+
+        return smoothed
+
+    def shortcut(self, actions: List[int], poses: List[tuple], i: int, j: int, goal: tuple):
+        """Replace actions i to j (exclusive) with a Reeds-Shepp path between poses i and j
+
+        Returns:
+            list: (primitive index, x, y, theta) of every step from pose i to the end of the path,
+                None if no Reeds-Shepp path gives fewer commands and drives to the goal without colliding
+        """
+        for rsPath in rs.get_sorted_paths(poses[i], poses[j], self.minR)[:self.candidates]:
+            rsActions = []
+            for element in rsPath:
+                rsActions += [self.choices.index((element.gear, element.steering))]*round(element.param/self.L)
+
+            candidate = actions[:i] + rsActions + actions[j:]
+            if (count_commands(candidate), len(candidate)) >= (count_commands(actions), len(actions)):
+                continue
+
+            steps = drive_primitives(self.map, self.L, self.minR, poses[i], candidate[i:])
+            if steps and within_goal_tolerance(steps[-1][1:], goal):
+                return steps
+
+        return None
+
+def count_commands(actions: List[int]) -> int:
+    """Number of construct_path_2 commands for a sequence of primitive indices
+    """
+    return sum(1 for k in range(len(actions)) if k == 0 or actions[k] != actions[k - 1])
@@ -0,0 +1,68 @@
+import hashlib
+import json
+import os
+
+PLAN_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'plan_cache')
+PLAN_CACHE_VERSION = 1 # bump when planner changes would change the plan for the same inputs
+
+class PlanCache():
+    def __init__(self, directory: str=PLAN_CACHE_DIR, capacity: int=64) -> None:
+        """Disk cache of task1 plans, one JSON file per obstacle layout and planner parameters
+
+        Args:
+            directory (str, optional): cache directory. Defaults to PLAN_CACHE_DIR.
+            capacity (int, optional): plans kept, the least recently used are evicted. Defaults to 64.
+        """
+        self.directory = directory
+        self.capacity = capacity
+
+    def key(self, obstacles, params: dict) -> str:
+        """Hash of the obstacle layout and planner parameters
+
+        Args:
+            obstacles (list): START_TASK obstacles, dicts with id, x, y and dir, in any order
+            params (dict): planner parameters
+
+        Returns:
+            str: cache key
+        """
+        layout = sorted((int(obstacle["id"]), int(obstacle["x"]), int(obstacle["y"]), obstacle["dir"]) for obstacle in obstacles)
+        canonical = json.dumps({"version": PLAN_CACHE_VERSION, "obstacles": layout, "params": params}, sort_keys=True)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        """Cached plan, None on a miss
+
+        Returns:
+            dict: commands, android and obstacleID lists of the plan
+        """
+        path = os.path.join(self.directory, key + '.json')
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if entry.get("version") != PLAN_CACHE_VERSION:
+            return None
+
+        os.utime(path) # mark as recently used
+        return entry["plan"]
+
+    def put(self, key: str, plan: dict) -> None:
+        """Store a plan and evict the least recently used plans over capacity
+
+        Args:
+            key (str): cache key
+            plan (dict): commands, android and obstacleID lists of the plan
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, key + '.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump({"version": PLAN_CACHE_VERSION, "plan": plan}, f)
+        os.replace(path + '.tmp', path)
+
+        entries = [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith('.json')]
+        entries.sort(key=os.path.getmtime)
+        for entry in entries[:max(len(entries) - self.capacity, 0)]:
+            os.remove(entry)
@@ -52,15 +52,152 @@ def get_optimal_path(start, end):
     return min(paths, key=path_length)
 
 def get_optimal_path_length(start, end, radius):
-    x_0 = start[0]/radius
-    y_0 = start[1]/radius
-    
-    x_f = end[0]/radius
-    y_f = end[1]/radius
+    """
+    Length of the shortest path from start to end for a turning radius,
+    poses are (x, y, theta) with theta in radians
+    """
+    return float(get_optimal_path_lengths([start[:3]], end, radius)[0])
 
-    opt_path = get_optimal_path((x_0, y_0, start[2]), (x_f, y_f, end[2]))
+def get_sorted_paths(start, end, radius):
+    """
+    All paths from start to end for a turning radius, shortest first, poses
+    are (x, y, theta) with theta in radians and path element parameters are
+    distances travelled in the same units as the poses
+    """
+    x, y, theta = utils.change_of_basis((start[0], start[1], math.degrees(start[2])), 
+                                        (end[0], end[1], math.degrees(end[2])))
+    paths = get_all_paths((0, 0, 0), (x/radius, y/radius, theta))
+    paths = [[replace(e, param=e.param*radius) for e in path] for path in paths]
+
+    return sorted(paths, key=path_length)
+
+def get_optimal_path_lengths(starts, end, radius):
+    """
+    Lengths of the shortest paths from each of starts to end for a turning
+    radius, without building the paths
+
+    Args:
+        starts (array-like): N x 3 array of (x, y, theta) start poses, theta in radians
+        end (array-like): (x, y, theta) end pose, theta in radians, or an N x 3 array of
+            end poses, one per start
+        radius (float): turning radius
+
+    Returns:
+        np.ndarray: N path lengths
+    """
+    starts = np.asarray(starts, dtype=float).reshape(-1, 3)
+    end = np.asarray(end, dtype=float)
+    cos_t = np.cos(starts[:, 2])
+    sin_t = np.sin(starts[:, 2])
+
+    # end in the frame of each start, scaled to unit turning radius
+    dx = (end[..., 0] - starts[:, 0])/radius
+    dy = (end[..., 1] - starts[:, 1])/radius
+    x = dx*cos_t + dy*sin_t
+    y = -dx*sin_t + dy*cos_t
+    phi = end[..., 2] - starts[:, 2]
+
+    # the timeflip and reflect variants of every formula have the same length as
+    # the formula evaluated at (-x, y, -phi), (x, -y, -phi) and (-x, -y, phi)
+    x = np.stack([x, -x, x, -x])
+    y = np.stack([y, y, -y, -y])
+    phi = np.stack([phi, -phi, -phi, phi])
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        lengths = np.fmin.reduce(formula_lengths(x, y, phi))
+
+    return radius*np.fmin.reduce(lengths, axis=0)
+
+def formula_lengths(x, y, phi):
+    """
+    Lengths of the paths given by the 12 formulas (path1 to path12) for
+    arrays of end poses, phi in radians. Formulas that do not apply give inf
+    (or nan, which np.fmin ignores).
+    """
+    M = utils.M_array
+    sin_phi = np.sin(phi)
+    cos_phi = np.cos(phi)
+
+    # polar coordinates shared between the formulas
+    xi, eta = x - sin_phi, y - 1 + cos_phi
+    rho_a, theta_a = np.hypot(xi, eta), np.arctan2(eta, xi)
+    xi, eta = x + sin_phi, y - 1 - cos_phi
+    rho_b, theta_b = np.hypot(xi, eta), np.arctan2(eta, xi)
+
+    lengths = []
+
+    # 8.1: CSC (same turns)
+    lengths.append(np.abs(theta_a) + rho_a + np.abs(M(phi - theta_a)))
+
+    # 8.2: CSC (opposite turns)
+    u = np.sqrt(rho_b*rho_b - 4)
+    t = M(theta_b + np.arctan2(2, u))
+    v = M(t - M(phi))
+    lengths.append(np.where(rho_b*rho_b >= 4, np.abs(t) + u + np.abs(v), np.inf))
+
+    # 8.3: C|C|C and 8.4 (1): C|CC
+    A = np.arccos(rho_a/4)
+    t = M(theta_a + np.pi/2 + A)
+    u = M(np.pi - 2*A)
+    v = M(phi - t - u)
+    lengths.append(np.where(rho_a <= 4, np.abs(t) + np.abs(u) + np.abs(v), np.inf))
+    v = M(t + u - phi)
+    lengths.append(np.where(rho_a <= 4, np.abs(t) + np.abs(u) + np.abs(v), np.inf))
+
+    # 8.4 (2): CC|C
+    u = np.arccos(1 - rho_a*rho_a/8)
+    A = np.arcsin(2*np.sin(u)/rho_a)
+    t = M(theta_a + np.pi/2 - A)
+    v = M(t - u - phi)
+    lengths.append(np.where(rho_a <= 4, np.abs(t) + np.abs(u) + np.abs(v), np.inf))
+
+    # 8.7: CCu|CuC
+    A = np.where(rho_b <= 2, np.arccos((rho_b + 2)/4), np.arccos((rho_b - 2)/4))
+    t = np.where(rho_b <= 2, M(theta_b + np.pi/2 + A), M(theta_b + np.pi/2 - A))
+    u = np.where(rho_b <= 2, M(A), M(np.pi - A))
+    v = M(phi - t + 2*u)
+    lengths.append(np.where(rho_b <= 4, np.abs(t) + 2*np.abs(u) + np.abs(v), np.inf))
+
+    # 8.8: C|CuCu|C
+    u1 = (20 - rho_b*rho_b)/16
+    u = np.arccos(u1)
+    A = np.arcsin(2*np.sin(u)/rho_b)
+    t = M(theta_b + np.pi/2 + A)
+    v = M(t - phi)
+    lengths.append(np.where((rho_b <= 6) & (0 <= u1) & (u1 <= 1), np.abs(t) + 2*np.abs(u) + np.abs(v), np.inf))
+
+    # 8.9 (1): C|C[pi/2]SC
+    u = np.sqrt(rho_a*rho_a - 4) - 2
+    A = np.arctan2(2, u + 2)
+    t = M(theta_a + np.pi/2 + A)
+    v = M(t - phi + np.pi/2)
+    lengths.append(np.where(rho_a >= 2, np.abs(t) + np.pi/2 + np.abs(u) + np.abs(v), np.inf))
+
+    # 8.9 (2): CSC[pi/2]|C
+    A = np.arctan2(u + 2, 2)
+    t = M(theta_a + np.pi/2 - A)
+    v = M(t - phi - np.pi/2)
+    lengths.append(np.where(rho_a >= 2, np.abs(t) + np.abs(u) + np.pi/2 + np.abs(v), np.inf))
+
+    # 8.10 (1): C|C[pi/2]SC
+    t = M(theta_b + np.pi/2)
+    v = M(phi - t - np.pi/2)
+    lengths.append(np.where(rho_b >= 2, np.abs(t) + np.pi/2 + np.abs(rho_b - 2) + np.abs(v), np.inf))
+
+    # 8.10 (2): CSC[pi/2]|C
+    t = M(theta_b)
+    v = M(phi - t - np.pi/2)
+    lengths.append(np.where(rho_b >= 2, np.abs(t) + np.abs(rho_b - 2) + np.pi/2 + np.abs(v), np.inf))
+
+    # 8.11: C|C[pi/2]SC[pi/2]|C
+    u = np.sqrt(rho_b*rho_b - 4) - 4
+    A = np.arctan2(2, u + 4)
+    t = M(theta_b + np.pi/2 + A)
+    v = M(t - phi)
+    lengths.append(np.where(rho_b >= 4, np.abs(t) + np.pi + np.abs(u) + np.abs(v), np.inf))
+
+    return lengths
 
-    return radius*path_length(opt_path)
 
 def get_all_paths(start, end):
     """
@@ -204,7 +341,7 @@ def path5(x, y, phi):
     eta = y - 1 + math.cos(phi)
     rho, theta = utils.R(xi, eta)
 
-    if rho <= 4:
+    if 0 < rho <= 4:
         u = math.acos(1 - rho*rho/8)
         A = math.asin(2 * math.sin(u) / rho)
         t = utils.M(theta + math.pi/2 - A)
@@ -398,5 +535,5 @@ def path12(x, y, phi):
     return path
 
 if __name__ == '__main__':
-    optimal_path_length = get_optimal_path_length((15, 15, np.pi/2), (150, 150, 0))
+    optimal_path_length = get_optimal_path_length((15, 15, np.pi/2), (150, 150, 0), 25)
     print(optimal_path_length)
\ No newline at end of file
@@ -0,0 +1,131 @@
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__ + '\..')))
+
+from objects.OccupancyMap import OccupancyMap
+from pathfinding.hybrid_astar import HybridAStar, Node, motion_primitives, drive_primitives, within_goal_tolerance
+from typing import List
+
+class Replanner():
+    def __init__(self, map: OccupancyMap, x_f: float, y_f: float, theta_f: float, **plannerArgs) -> None:
+        """Incremental planner to a fixed goal, repairs the previous path instead of searching from scratch
+
+        HybridAStar states are continuous and successors depend on the parent pose, so there is no fixed
+        graph for D* Lite or LPA* to repair. Instead the previous path is kept, and after the map changes or
+        the start moves, a short multi-goal search reconnects the start to the part of the previous path
+        that is still free, whose actions are then driven again from where the search ended.
+
+        Args:
+            map (OccupancyMap): map, may have obstacles added between calls to plan
+            x_f (float): ending x coordinate of rear axle
+            y_f (float): ending y coordinate of rear axle
+            theta_f (float): ending direction
+            plannerArgs: other HybridAStar arguments (L, minR, heuristic, costs...)
+        """
+        self.map = map
+        self.goal = (x_f, y_f, theta_f)
+        self.plannerArgs = plannerArgs
+        self.L = plannerArgs.get('L', 5)
+        self.minR = plannerArgs.get('minR', 25)
+        self.start = None
+        self.path = None
+
+    def plan(self, x_0: float, y_0: float, theta_0: float) -> List[Node]:
+        """Path from the start to the goal, reusing the previous path where it is still free
+
+        Args:
+            x_0 (float): starting x coordinate of rear axle
+            y_0 (float): starting y coordinate of rear axle
+            theta_0 (float): starting direction
+
+        Returns:
+            List[Node]: path (start excluded), None if not found
+        """
+        start = Node(x_0, y_0, theta_0, None)
+
+        if self.path is not None:
+            blocked = self.blocked_nodes()
+            rejoin = blocked[-1] + 1 if blocked else 0
+            moved = (x_0, y_0, theta_0) != (self.start.x, self.start.y, self.start.theta)
+
+            if not blocked and not moved:
+                print("Previous path still valid")
+                return self.path
+
+            # near the previous start or a node of the previous path beyond any blocked part, keep driving
+            # the remaining actions from the actual start
+            for i in range(len(self.path) - 2, rejoin - 2, -1):
+                if start == (self.path[i] if i >= 0 else self.start):
+                    path = self.redrive(start, self.path[i + 1:])
+                    if path is None:
+                        break
+                    print("Continuing on previous path")
+                    return self.update(start, path)
+            else: # not near the previous path, search for a way back to it
+                if rejoin < len(self.path):
+                    algo = HybridAStar(self.map, x_0, y_0, theta_0, *self.goal,
+                                       goals=[(node.x, node.y, node.theta) for node in self.path[rejoin:]], **self.plannerArgs)
+                    path, _ = algo.find_path()
+                    if path is None:
+                        return self.update(start, None) # the goal itself was one of the targets
+
+                    suffix = self.redrive(path[-1], self.path[rejoin + algo.goalReached + 1:])
+                    if suffix is not None:
+                        print("Reconnected to previous path")
+                        return self.update(start, path + suffix)
+
+        algo = HybridAStar(self.map, x_0, y_0, theta_0, *self.goal, **self.plannerArgs)
+        path, _ = algo.find_path()
+        return self.update(start, path)
+
+    def redrive(self, start: Node, nodes: List[Node]) -> List[Node]:
+        """Drive the actions of nodes of the previous path again from start, which is only within tolerance of
+        the pose they were planned from
+
+        Args:
+            start (Node): pose to drive from
+            nodes (List[Node]): nodes of the previous path, their prevAction are driven in order
+
+        Returns:
+            List[Node]: new nodes after every action, None if they collide or no longer end within tolerance of the goal
+        """
+        choices = [choice for choice, _, _, _, _, _ in motion_primitives(self.L, self.minR)]
+        steps = drive_primitives(self.map, self.L, self.minR, (start.x, start.y, start.theta),
+                                 [choices.index(node.prevAction) for node in nodes])
+        if steps is None:
+            return None
+
+        end = steps[-1][1:] if steps else (start.x, start.y, start.theta)
+        if not within_goal_tolerance(end, self.goal):
+            return None
+
+        path = []
+        prev = start
+        for (i, x, y, theta), node in zip(steps, nodes):
+            prev = Node(x, y, theta, choices[i], parent=prev)
+            prev.g = node.g
+            path.append(prev)
+
+        return path
+
+    def update(self, start: Node, path: List[Node]) -> List[Node]:
+        self.start = start
+        self.path = path
+        if path:
+            path[0].parent = start
+        return path
+
+    def blocked_nodes(self) -> List[int]:
+        """Indices of nodes of the previous path that now collide, each step driven from the previous node
+        with drive_primitives, so checked the same way as HybridAStar checks children
+        """
+        choices = [choice for choice, _, _, _, _, _ in motion_primitives(self.L, self.minR)]
+
+        blocked = []
+        prev = self.start
+        for i, node in enumerate(self.path):
+            if drive_primitives(self.map, self.L, self.minR, (prev.x, prev.y, prev.theta), [choices.index(node.prevAction)]) is None:
+                blocked.append(i)
+            prev = node
+
+        return blocked
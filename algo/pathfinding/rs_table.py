@@ -0,0 +1,120 @@
+import numpy as np
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__ + '\..')))
+
+import pathfinding.reeds_shepp as rs
+
+RS_TABLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rs_tables')
+XY_RANGE = 290      # cm, covers the diagonal of the 200x200 arena
+XY_STEP = 5         # cm
+THETA_BINS = 72
+
+_tables = {}
+
+class ReedsSheppTable():
+    def __init__(self, lengths: np.ndarray) -> None:
+        """Lookup table of Reeds-Shepp path lengths
+
+        Args:
+            lengths (np.ndarray): (nx, ny, THETA_BINS) lengths from (0, 0, 0) to (dx, dy, dtheta), with
+                dx, dy from -XY_RANGE to XY_RANGE in steps of XY_STEP and dtheta = -pi + k*2*pi/THETA_BINS
+        """
+        self.lengths = lengths
+        self.n_xy = lengths.shape[0]
+
+    def get_lengths(self, starts, end) -> np.ndarray:
+        """Interpolated Reeds-Shepp lengths from each of starts to end
+
+        Accurate on average (mean error under 0.1cm) but interpolation across the discontinuities of the
+        Reeds-Shepp length can be off by ~5cm either way, most often for nearby poses. The lengths can
+        overestimate, so as a heuristic they are not admissible.
+
+        Args:
+            starts (array-like): N x 3 array of (x, y, theta) start poses, theta in radians
+            end (array-like): (x, y, theta) end pose, theta in radians, or an N x 3 array of
+                end poses, one per start
+
+        Returns:
+            np.ndarray: N path lengths
+        """
+        starts = np.asarray(starts, dtype=float).reshape(-1, 3)
+        end = np.asarray(end, dtype=float)
+        cos_t = np.cos(starts[:, 2])
+        sin_t = np.sin(starts[:, 2])
+
+        # end in the frame of each start, see utils.change_of_basis
+        dx = end[..., 0] - starts[:, 0]
+        dy = end[..., 1] - starts[:, 1]
+        x = dx*cos_t + dy*sin_t
+        y = -dx*sin_t + dy*cos_t
+        theta = np.mod(end[..., 2] - starts[:, 2] + np.pi, 2*np.pi)
+
+        # trilinear interpolation, heading wraps around
+        i = np.clip((x + XY_RANGE)/XY_STEP, 0, self.n_xy - 1)
+        j = np.clip((y + XY_RANGE)/XY_STEP, 0, self.n_xy - 1)
+        k = theta/(2*np.pi/THETA_BINS)
+        i0 = np.minimum(i.astype(int), self.n_xy - 2)
+        j0 = np.minimum(j.astype(int), self.n_xy - 2)
+        k0 = k.astype(int) % THETA_BINS
+        k1 = (k0 + 1) % THETA_BINS
+        di, dj, dk = i - i0, j - j0, k - np.floor(k)
+
+        lengths = self.lengths
+        c00 = lengths[i0, j0, k0]*(1 - di) + lengths[i0 + 1, j0, k0]*di
+        c10 = lengths[i0, j0 + 1, k0]*(1 - di) + lengths[i0 + 1, j0 + 1, k0]*di
+        c01 = lengths[i0, j0, k1]*(1 - di) + lengths[i0 + 1, j0, k1]*di
+        c11 = lengths[i0, j0 + 1, k1]*(1 - di) + lengths[i0 + 1, j0 + 1, k1]*di
+
+        return (c00*(1 - dj) + c10*dj)*(1 - dk) + (c01*(1 - dj) + c11*dj)*dk
+
+def table_path(minR: float) -> str:
+    return os.path.join(RS_TABLE_DIR, f"rs_table_r{minR:g}_xy{XY_RANGE}_{XY_STEP}_t{THETA_BINS}.npy")
+
+def build_table(minR: float) -> np.ndarray:
+    """Compute the Reeds-Shepp length table for a turning radius
+
+    Args:
+        minR (float): minimum turning radius in cm
+
+    Returns:
+        np.ndarray: lengths from (0, 0, 0) to every (dx, dy, dtheta) on the table grid
+    """
+    xy = np.arange(-XY_RANGE, XY_RANGE + XY_STEP, XY_STEP, dtype=float)
+    x, y = np.meshgrid(xy, xy, indexing='ij')
+    lengths = np.empty((len(xy), len(xy), THETA_BINS), dtype=np.float32)
+
+    for k in range(THETA_BINS):
+        theta = -np.pi + k*2*np.pi/THETA_BINS
+        # Reeds-Shepp paths are reversible, so the length from the grid pose to the origin is the same
+        poses = np.stack([x.ravel(), y.ravel(), np.full(x.size, theta)], axis=1)
+        lengths[:, :, k] = rs.get_optimal_path_lengths(poses, (0, 0, 0), minR).reshape(x.shape)
+
+    return lengths
+
+def get_table(minR: float) -> ReedsSheppTable:
+    """Reeds-Shepp length table for a turning radius, memory mapped from RS_TABLE_DIR
+
+    The table is built and saved the first time a turning radius is used.
+
+    Args:
+        minR (float): minimum turning radius in cm
+
+    Returns:
+        ReedsSheppTable: lookup table
+    """
+    if minR not in _tables:
+        path = table_path(minR)
+        if not os.path.exists(path):
+            print(f"Building Reeds-Shepp table for minR = {minR:g}...")
+            os.makedirs(RS_TABLE_DIR, exist_ok=True)
+            np.save(path, build_table(minR))
+
+        _tables[minR] = ReedsSheppTable(np.load(path, mmap_mode='r'))
+
+    return _tables[minR]
+
+if __name__ == '__main__':
+    table = get_table(26.5)
+    print(table.get_lengths([(15, 15, np.pi/2)], (150, 150, 0)),
+          rs.get_optimal_path_length((15, 15, np.pi/2), (150, 150, 0), 26.5))
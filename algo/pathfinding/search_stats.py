@@ -0,0 +1,38 @@
+class SearchStats():
+    def __init__(self, onExpand=None) -> None:
+        """Counters and timers of HybridAStar searches, pass as HybridAStar(stats=...)
+
+        Without a stats object the search only pays for one None check per event. The same object
+        can be shared by several searches (e.g. the weights of find_path_anytime), counts add up.
+
+        Args:
+            onExpand (List[callable], optional): called with (x, y, theta, g, f) for every node expanded.
+                Defaults to None.
+        """
+        self.searches = 0
+        self.expansions = 0
+        self.pushes = 0
+        self.collisionRejects = 0 # children colliding with obstacles
+        self.dominated = 0 # children outside the grid or whose cell is already open or closed at a lower cost
+        self.boundPruned = 0 # children pruned by the upper bound of find_path_anytime
+        self.timers = {} # seconds in each phase: setup, search, reconstruct, and heuristic and shots within search
+        self.openSizes = {} # number of expansions by open set size bucket, bucket k holds sizes in [2^(k-1), 2^k)
+        self.onExpand = list(onExpand or [])
+
+    def add_time(self, phase: str, seconds: float) -> None:
+        self.timers[phase] = self.timers.get(phase, 0.) + seconds
+
+    def expanded(self, openSize: int, x: float, y: float, theta: float, g: float, f: float) -> None:
+        self.expansions += 1
+        bucket = openSize.bit_length()
+        self.openSizes[bucket] = self.openSizes.get(bucket, 0) + 1
+        for callback in self.onExpand:
+            callback(x, y, theta, g, f)
+
+    def to_dict(self) -> dict:
+        """JSON serialisable copy of the counters and timers
+        """
+        return {"searches": self.searches, "expansions": self.expansions, "pushes": self.pushes,
+                "collisionRejects": self.collisionRejects, "dominated": self.dominated,
+                "boundPruned": self.boundPruned, "timers": dict(self.timers),
+                "openSizes": {f"<{2**bucket}": count for bucket, count in sorted(self.openSizes.items())}}
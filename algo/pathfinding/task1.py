@@ -5,82 +5,410 @@ from algo.pathfinding.hybrid_astar import HybridAStar
 from algo.objects.OccupancyMap import OccupancyMap
 from algo.objects.Obstacle import Obstacle
 from algo.pathfinding.hamiltonian import obstacle_to_checkpoint_all
+from algo.pathfinding.plan_cache import PlanCache
+from algo.pathfinding.search_stats import SearchStats
+from algo.pathfinding.path_smoothing import PathSmoother
+from algo.pathfinding.cost_model import TimeCostModel
 import numpy as np
 import constants as c
+import json
+import multiprocessing as mp
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# worker process state, set by _init_worker and plan_leg
+_leg = None
+_bestIndex = None
+_obstacleData = None # layout of _map, the pool is kept across START_TASKs
+_map = None
+
+def _init_worker(leg, bestIndex):
+    global _leg, _bestIndex
+    _leg = leg
+    _bestIndex = bestIndex
+
+def plan_leg(leg: int, index: int, obstacleData: tuple, start, checkpoint, plannerKwargs: dict, 
+             collectStats: bool=False, legTimeBudget: float=None):
+    """Plan to one candidate checkpoint in a worker process
+
+    The search gives up once the main process has moved on to another leg or a more preferred
+    candidate (lower index) of this leg has already found a path. The OccupancyMap is rebuilt from
+    obstacleData ((x_g, y_g, facing, id) of every obstacle) when the layout changes. plannerKwargs are the
+    other HybridAStar arguments, see task1.planner_kwargs. With legTimeBudget the search is
+    HybridAStar.find_path_anytime within that budget, as in task1.search.
+
+    Returns:
+        (List[Node], dict): path, None if not found, and SearchStats.to_dict() if collectStats
+    """
+    global _obstacleData, _map
+    if obstacleData != _obstacleData:
+        _map = OccupancyMap([Obstacle(x_g, y_g, facing, id) for x_g, y_g, facing, id in obstacleData])
+        _obstacleData = obstacleData
+
+    stats = SearchStats() if collectStats else None
+    algo = HybridAStar(map=_map, 
+                x_0=start[0], y_0=start[1], theta_0=start[2], 
+                x_f=checkpoint[0], y_f=checkpoint[1], theta_f=checkpoint[2], 
+                stopCondition=lambda: _leg.value != leg or _bestIndex.value < index, stats=stats, **plannerKwargs)
+    if legTimeBudget is None:
+        path, pathHistory = algo.find_path()
+    else:
+        path, bound = algo.find_path_anytime(legTimeBudget)
+    return path, stats.to_dict() if stats is not None else None
 
 
 class task1():
-    def __init__(self):
+    def __init__(self, workers: int=1, multiGoal: bool=False, plannerOrdering: bool=False, legTimeBudget: float=None,
+                 planCache: PlanCache=None, statsPath: str=None, bidirectional: bool=False, smoothing: bool=False,
+                 costModel: TimeCostModel=None):
+        """task1 constructor
+
+        Args:
+            workers (int, optional): processes planning candidate checkpoints in parallel, in batches of workers
+                candidates. The pool is started (spawned) on the first START_TASK and kept until close(), 1 plans
+                the candidates one at a time in this process. Defaults to 1.
+            multiGoal (bool, optional): plan each leg with a single search to any of the candidate checkpoints
+                instead of trying them in preference order. Defaults to False.
+            plannerOrdering (bool, optional): order obstacles by HybridAStar path lengths instead of Euclidean
+                distances, slower to plan but usually a shorter course. Defaults to False.
+            legTimeBudget (float, optional): wall clock budget in seconds for each search of a leg, using
+                HybridAStar.find_path_anytime. Defaults to None (search until done).
+            planCache (PlanCache, optional): reuse plans of obstacle layouts planned before with the same
+                parameters, paths are not cached so self.paths stays empty on a hit. Only plans with a leg to
+                every obstacle are cached. Defaults to None.
+            statsPath (str, optional): collect SearchStats of every search and append them to this file, one
+                JSON line per leg, also kept in self.legStats. Defaults to None.
+            bidirectional (bool, optional): search each candidate checkpoint from both ends, far fewer expansions
+                on long legs. Not used with multiGoal. Defaults to False.
+            smoothing (bool, optional): shortcut each path with PathSmoother before construct_path_2, fewer and
+                longer commands. Defaults to False.
+            costModel (TimeCostModel, optional): plan the fastest paths to execute, e.g. TimeCostModel.load() for
+                the constants in pathfinding/time_calibration.json. Defaults to None (shortest paths).
+        """
+        self.workers = workers
+        self.multiGoal = multiGoal
+        self.plannerOrdering = plannerOrdering
+        self.legTimeBudget = legTimeBudget
+        self.planCache = planCache
+        self.statsPath = statsPath
+        self.bidirectional = bidirectional
+        self.smoothing = smoothing
+        self.costModel = costModel
+        self.legStats = []
+        self.searchStats = [] # stats of the searches of the leg being planned
         self.checkpoints = []
         self.paths = []
         self.commands = []
         self.android = []
         self.obstacleID = []
         self.imageID: list[str] = []
+        self.planning = False
+        self.legReady = threading.Condition() # guards the leg lists while planning in the background
+        self.pool = None # (executor, leg, bestIndex) when workers > 1, see get_pool
+        self.legCounter = 0 # id of the leg planned in parallel, unique across START_TASKs
+        self.obstacleData = None # layout passed to plan_leg
         
     def generate_path(self, message):
-        obstacles = []
-        L=26.5*np.pi/4/5 # Can try changing to 26.25 
-        minR=26.5
-
-        for obstacle in message["data"]["obstacles"]:
-            obsDIR = obstacle["dir"]
-            if obsDIR == "N":
-                invertObs = "S"
-            elif obsDIR == "S":
-                invertObs = "N"
-            elif obsDIR == "W":
-                invertObs = "E"
-            elif obsDIR == "E":
-                invertObs = "W"
-            obstacles.append(Obstacle(obstacle["x"] * 2, obstacle["y"] * 2, invertObs, int(obstacle["id"])))
-
-        map = OccupancyMap(obstacles)
-        tsp = Hamiltonian(map, obstacles, 10, 10, 0, -np.pi/2, 'euclidean', minR) # 3rd element: (N: np.pi/2, E: 0)
-        current_pos = tsp.start
-        obstacle_path = tsp.find_nearest_neighbor_path()
-        for idx, obstacle in enumerate(obstacle_path):
+        """Plan every leg before returning
+        """
+        for _ in self.plan_legs(message):
+            pass
+
+    def start_planning(self, message) -> threading.Thread:
+        """Plan legs in a background thread, get_command_to_next_obstacle and has_task_ended wait
+        for the next leg instead of the whole plan, so the first leg can be sent as soon as it is found
+        """
+        self.planning = True
+        thread = threading.Thread(target=self.generate_path, args=(message,), name="task1-planner", daemon=True)
+        thread.start()
+        return thread
+
+    def plan_legs(self, message):
+        """Generator planning one leg per obstacle, yields (commands, pathDisplay, obstacle id) of each leg
+        found after adding it to the leg lists
+        """
+        pool = None
+        try:
+            obstacles = []
+            L=26.5*np.pi/4/5 # Can try changing to 26.25 
+            minR=26.5
+
+            if self.planCache is not None:
+                key = self.planCache.key(message["data"]["obstacles"], self.planner_params(L, minR))
+                plan = self.planCache.get(key)
+                if plan is not None:
+                    print("Plan found in cache")
+                    for leg in zip(plan["commands"], plan["android"], plan["obstacleID"]):
+                        self.add_leg(*leg)
+                        yield leg
+                    return
+
+            for obstacle in message["data"]["obstacles"]:
+                obsDIR = obstacle["dir"]
+                if obsDIR == "N":
+                    invertObs = "S"
+                elif obsDIR == "S":
+                    invertObs = "N"
+                elif obsDIR == "W":
+                    invertObs = "E"
+                elif obsDIR == "E":
+                    invertObs = "W"
+                obstacles.append(Obstacle(obstacle["x"] * 2, obstacle["y"] * 2, invertObs, int(obstacle["id"])))
+
+            map = OccupancyMap(obstacles)
+            tsp = Hamiltonian(map, obstacles, 10, 10, 0, -np.pi/2, 'euclidean', minR) # 3rd element: (N: np.pi/2, E: 0)
+            current_pos = tsp.start
+            obstacle_path = tsp.find_planner_cost_path(L) if self.plannerOrdering else tsp.find_optimal_path()
+
+            if self.workers > 1 and not self.multiGoal:
+                self.obstacleData = tuple((o.x_g, o.y_g, o.facing, o.id) for o in obstacles)
+                pool = self.get_pool()
+
+            legs = []
+            for leg in self.plan_obstacle_path(map, obstacle_path, current_pos, L, minR, pool):
+                legs.append(leg)
+                yield leg
+
+            # a plan missing legs (no path found, or no checkpoint) is not cached, later runs plan it again
+            if self.planCache is not None and len(legs) == len(obstacles):
+                self.planCache.put(key, {"commands": [leg[0] for leg in legs], "android": [leg[1] for leg in legs], 
+                                         "obstacleID": [leg[2] for leg in legs]})
+
+        finally:
+            if pool is not None:
+                executor, leg, bestIndex = pool
+                leg.value = -1 # stop searches still running
+
+            with self.legReady:
+                self.planning = False
+                self.legReady.notify_all()
+
+    def plan_obstacle_path(self, map, obstacle_path, current_pos, L, minR, pool):
+        for obstacle in obstacle_path:
+            legStart = time.perf_counter()
+            self.searchStats = []
             valid_checkpoints = obstacle_to_checkpoint_all(map, obstacle, theta_offset=-np.pi/2)
-            path = None
-            while path == None and valid_checkpoints:
-                checkpoint = valid_checkpoints.pop(0)
-                print(f"Routing to obstacle (x_g: {obstacle.x_g}, y_g: {obstacle.y_g}), x: {checkpoint[0]}, y: {checkpoint[1]} theta: {checkpoint[2]*180/np.pi}...")
-                algo = HybridAStar(map=map, 
-                            x_0=current_pos[0], y_0=current_pos[1], theta_0=current_pos[2], 
-                            x_f=checkpoint[0], y_f=checkpoint[1], 
-                            theta_f=checkpoint[2], steeringChangeCost=10, gearChangeCost=10, 
-                            L=L, minR=minR, heuristic='euclidean', simulate=False, thetaBins=24)
-                path, pathHistory = algo.find_path()
-                if path == None:
-                    print("Path failed to converge, trying another final position...")
+            if self.multiGoal:
+                path, checkpoint = self.route_multi_goal(map, obstacle, current_pos, valid_checkpoints, L, minR)
+            elif pool is not None:
+                path, checkpoint = self.route_in_parallel(*pool, obstacle, current_pos, valid_checkpoints, L, minR)
+            else:
+                path, checkpoint = self.route(map, obstacle, current_pos, valid_checkpoints, L, minR)
+
+            if self.statsPath is not None:
+                self.write_leg_stats(obstacle, path, checkpoint, time.perf_counter() - legStart)
 
             if path != None:
-                self.paths.append(path)
+                if self.smoothing:
+                    path = PathSmoother(map, L, minR).smooth(path, checkpoint[:3])
                 current_pos = (path[-1].x, path[-1].y, path[-1].theta)
                 commands, pathDisplay = construct_path_2(path, L, minR)
-                self.commands.append(commands)
-                self.android.append(pathDisplay)
-                self.obstacleID.append(checkpoint[3])
+                self.add_leg(commands, pathDisplay, checkpoint[3], path)
                 print_path(path)
+                yield commands, pathDisplay, checkpoint[3]
             
             else:
                 print("Path could not be found, routing to next obstacle...")
+
+    def add_leg(self, commands, pathDisplay, obstacleID, path=None):
+        with self.legReady:
+            if path != None:
+                self.paths.append(path)
+            self.commands.append(commands)
+            self.android.append(pathDisplay)
+            self.obstacleID.append(obstacleID)
+            self.legReady.notify_all()
+
+    def record_search(self, checkpoints, stats: dict):
+        """Keep the stats of one search of the current leg to some candidate checkpoints, stats is None
+        when not collecting
+        """
+        if stats is not None:
+            self.searchStats.append({"checkpoints": [[float(v) for v in checkpoint[:3]] for checkpoint in checkpoints], **stats})
+
+    def write_leg_stats(self, obstacle, path, checkpoint, wallTime: float):
+        """Append the stats of every search of a leg to statsPath
+        """
+        legStats = {"obstacleID": obstacle.id, "found": path is not None, "steps": len(path) if path is not None else 0,
+                    "checkpoint": [float(v) for v in checkpoint[:3]] if path is not None else None, 
+                    "wallTime": wallTime, "searches": self.searchStats}
+        self.legStats.append(legStats)
+        with open(self.statsPath, 'a') as f:
+            f.write(json.dumps(legStats) + "\n")
+
+    def planner_kwargs(self, L, minR) -> dict:
+        """HybridAStar arguments of every search, in route, route_multi_goal and plan_leg, besides the map,
+        start, goals, stats and stopCondition
+        """
+        return {"L": L, "minR": minR, "steeringChangeCost": 10, "gearChangeCost": 10, "thetaBins": 24, 
+                "heuristic": 'euclidean', "simulate": False, "bidirectional": self.bidirectional and not self.multiGoal, 
+                "costModel": self.costModel}
+
+    def planner_params(self, L, minR) -> dict:
+        """Parameters that change the plan for a layout, planner_kwargs and the task1 options
+        """
+        params = self.planner_kwargs(L, minR)
+        params.update({"multiGoal": self.multiGoal, "plannerOrdering": self.plannerOrdering, 
+                       "legTimeBudget": self.legTimeBudget, "smoothing": self.smoothing, 
+                       "costModel": self.costModel.to_dict() if self.costModel is not None else None})
+        return params
+
+    def new_stats(self) -> SearchStats:
+        return SearchStats() if self.statsPath is not None else None
+
+    def search(self, algo: HybridAStar):
+        """Run a search, within legTimeBudget if set
+        """
+        if self.legTimeBudget is None:
+            path, pathHistory = algo.find_path()
+        else:
+            path, bound = algo.find_path_anytime(self.legTimeBudget)
+
+        if algo.stats is not None:
+            self.record_search(algo.goals if algo.goals is not None else [(algo.x_f, algo.y_f, algo.theta_f)], algo.stats.to_dict())
+        return path
+
+    def route(self, map, obstacle, current_pos, valid_checkpoints, L, minR):
+        """Try candidate checkpoints one at a time in preference order
+
+        Returns:
+            (List[Node], tuple): first path found and its checkpoint, (None, None) if none found
+        """
+        path = None
+        checkpoint = None
+        while path == None and valid_checkpoints:
+            checkpoint = valid_checkpoints.pop(0)
+            print(f"Routing to obstacle (x_g: {obstacle.x_g}, y_g: {obstacle.y_g}), x: {checkpoint[0]}, y: {checkpoint[1]} theta: {checkpoint[2]*180/np.pi}...")
+            algo = HybridAStar(map=map, 
+                        x_0=current_pos[0], y_0=current_pos[1], theta_0=current_pos[2], 
+                        x_f=checkpoint[0], y_f=checkpoint[1], theta_f=checkpoint[2], 
+                        stats=self.new_stats(), **self.planner_kwargs(L, minR))
+            path = self.search(algo)
+            if path == None:
+                print("Path failed to converge, trying another final position...")
+
+        return path, checkpoint
+
+    def route_multi_goal(self, map, obstacle, current_pos, valid_checkpoints, L, minR):
+        """Single search to whichever candidate checkpoint is reached first
+
+        Returns:
+            (List[Node], tuple): path and its checkpoint, (None, None) if none found
+        """
+        if not valid_checkpoints:
+            return None, None
+
+        print(f"Routing to obstacle (x_g: {obstacle.x_g}, y_g: {obstacle.y_g}), {len(valid_checkpoints)} final positions...")
+        algo = HybridAStar(map=map, 
+                    x_0=current_pos[0], y_0=current_pos[1], theta_0=current_pos[2], 
+                    goals=valid_checkpoints, stats=self.new_stats(), **self.planner_kwargs(L, minR))
+        path = self.search(algo)
+        if path == None:
+            return None, None
+
+        return path, valid_checkpoints[algo.goalReached]
+
+    def get_pool(self):
+        """Worker pool of parallel planning, started on first use with the spawn start method since
+        PC_client plans from a thread while other threads are running
+
+        Returns:
+            (ProcessPoolExecutor, mp.Value, mp.Value): executor, id of the leg being planned and index
+                of the most preferred candidate found so far
+        """
+        if self.pool is None:
+            context = mp.get_context('spawn')
+            leg = context.Value('i', -1)
+            bestIndex = context.Value('i', 0)
+            executor = ProcessPoolExecutor(self.workers, mp_context=context, initializer=_init_worker, 
+                                           initargs=(leg, bestIndex))
+            self.pool = (executor, leg, bestIndex)
+
+        return self.pool
+
+    def close(self):
+        """Stop the worker pool, if any
+        """
+        if self.pool is not None:
+            executor, leg, bestIndex = self.pool
+            leg.value = -1
+            executor.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+    def route_in_parallel(self, executor, leg, bestIndex, obstacle, current_pos, valid_checkpoints, L, minR):
+        """Plan candidate checkpoints in parallel, in batches of workers, keeping the first success in preference order
+
+        Once a candidate succeeds, less preferred candidates of its batch stop searching and later batches
+        are not submitted.
+
+        Returns:
+            (List[Node], tuple): path and its checkpoint, (None, None) if none found
+        """
+        self.legCounter += 1
+        leg.value = self.legCounter
+        bestIndex.value = len(valid_checkpoints)
+
+        def on_done(future, index):
+            if not future.cancelled() and future.exception() is None and future.result()[0] is not None:
+                with bestIndex.get_lock():
+                    bestIndex.value = min(bestIndex.value, index)
+
+        plannerKwargs = self.planner_kwargs(L, minR)
+        path = None
+        checkpoint = None
+        for batchStart in range(0, len(valid_checkpoints), self.workers):
+            futures = {}
+            for index in range(batchStart, min(batchStart + self.workers, len(valid_checkpoints))):
+                candidate = valid_checkpoints[index]
+                print(f"Routing to obstacle (x_g: {obstacle.x_g}, y_g: {obstacle.y_g}), x: {candidate[0]}, y: {candidate[1]} theta: {candidate[2]*180/np.pi}...")
+                future = executor.submit(plan_leg, self.legCounter, index, self.obstacleData, current_pos, candidate, 
+                                         plannerKwargs, self.statsPath is not None, self.legTimeBudget)
+                future.add_done_callback(lambda future, index=index: on_done(future, index))
+                futures[index] = future
+
+            for index, future in futures.items():
+                path, stats = future.result()
+                self.record_search([valid_checkpoints[index]], stats)
+                if path != None:
+                    checkpoint = valid_checkpoints[index]
+                    break
+
+                print("Path failed to converge, trying another final position...")
+
+            for future in futures.values():
+                future.cancel()
+
+            if path != None:
+                break
+
+        return path, checkpoint
         
     
+    def wait_for_leg(self):
+        """Block while planning in the background and no planned leg is left
+        """
+        with self.legReady:
+            self.legReady.wait_for(lambda: self.commands or not self.planning)
+
     def get_command_to_next_obstacle(self):
+        self.wait_for_leg()
         nextCommand = None
         nextPath = None
-        if self.commands:
-            nextCommand = self.commands.pop(0)
-        if self.android:
-            nextPath = self.android.pop(0)
+        with self.legReady:
+            if self.commands:
+                nextCommand = self.commands.pop(0)
+            if self.android:
+                nextPath = self.android.pop(0)
         return construct_json(nextCommand, nextPath)
 
     def get_obstacle_id(self):
-        obstacle_id = self.obstacleID.pop(0)
+        with self.legReady:
+            obstacle_id = self.obstacleID.pop(0)
         return obstacle_id
     
     def has_task_ended(self):
+        self.wait_for_leg()
         return not self.commands
     
     def update_image_id(self, imageID):
@@ -0,0 +1,159 @@
+import argparse
+import contextlib
+import csv
+import io
+import json
+import random
+import time
+import numpy as np
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__ + '\..')))
+
+from objects.OccupancyMap import OccupancyMap
+from pathfinding.hybrid_astar import HybridAStar
+from pathfinding.hamiltonian import Hamiltonian, obstacle_to_checkpoint_all, generate_random_obstacles
+from simulation.testing import get_maps
+
+BENCHMARK_VERSION = 2 # 2: legs and failures include obstacles without a valid checkpoint
+FIELDS = ['map', 'heuristic', 'legs', 'failures', 'nodes_expanded', 'wall_time', 'path_length', 'gear_changes']
+HEURISTICS = ['euclidean', 'hybriddiag', 'reeds-shepp', 'rs-table', 'rs-grid']
+
+# same planner settings as task1
+L = 26.5*np.pi/4/5
+MIN_R = 26.5
+
+def benchmark_map(obstacles, heuristic: str) -> dict:
+    """Order the obstacles with Hamiltonian and plan every leg with HybridAStar, trying checkpoints
+    in preference order like task1
+
+    Args:
+        obstacles (List[Obstacle]): obstacle layout
+        heuristic (str): HybridAStar heuristic
+
+    Returns:
+        dict: totals over all legs, see FIELDS. Obstacles left out of the Hamiltonian order (no valid
+            checkpoint) count as failed legs.
+    """
+    result = {'heuristic': heuristic, 'legs': len(obstacles), 'failures': 0, 'nodes_expanded': 0, 'wall_time': 0.,
+              'path_length': 0., 'gear_changes': 0}
+
+    start = time.perf_counter()
+    map = OccupancyMap(obstacles)
+    tsp = Hamiltonian(map, obstacles, 10, 10, 0, -np.pi/2, 'euclidean', MIN_R)
+    current_pos = tsp.start
+
+    order = tsp.find_optimal_path()
+    result['failures'] += len(obstacles) - len(order)
+
+    for obstacle in order:
+        path = None
+        for checkpoint in obstacle_to_checkpoint_all(map, obstacle, theta_offset=-np.pi/2):
+            algo = HybridAStar(map=map, x_0=current_pos[0], y_0=current_pos[1], theta_0=current_pos[2],
+                               x_f=checkpoint[0], y_f=checkpoint[1], theta_f=checkpoint[2],
+                               steeringChangeCost=10, gearChangeCost=10, L=L, minR=MIN_R, heuristic=heuristic)
+            path, _ = algo.find_path()
+            result['nodes_expanded'] += algo.nodesExpanded
+            if path is not None:
+                break
+
+        if path is None:
+            result['failures'] += 1
+            continue
+
+        current_pos = (path[-1].x, path[-1].y, path[-1].theta)
+        result['path_length'] += len(path)*L
+        result['gear_changes'] += sum(prev.prevAction[0] != node.prevAction[0] for prev, node in zip(path, path[1:]))
+
+    result['wall_time'] = time.perf_counter() - start
+    return result
+
+def get_layouts(randomCount: int, seed: int, obstacleCount: int) -> dict:
+    """testing.get_maps() layouts and seeded random layouts, by name
+    """
+    layouts = {f"testing-{i}": obstacles for i, obstacles in enumerate(get_maps())}
+    for i in range(randomCount):
+        random.seed(seed + i)
+        layouts[f"random-{seed + i}"] = generate_random_obstacles(40, obstacleCount)
+
+    return layouts
+
+def run(heuristics, randomCount: int, seed: int, obstacleCount: int) -> dict:
+    rows = []
+    for name, obstacles in get_layouts(randomCount, seed, obstacleCount).items():
+        for heuristic in heuristics:
+            with contextlib.redirect_stdout(io.StringIO()): # planner progress prints
+                result = benchmark_map(obstacles, heuristic)
+            result['map'] = name
+            rows.append(result)
+            print(", ".join(f"{field}={result[field]:.2f}" if isinstance(result[field], float) else f"{field}={result[field]}"
+                            for field in FIELDS))
+
+    return {'version': BENCHMARK_VERSION, 'L': L, 'minR': MIN_R, 'results': rows}
+
+def save(report: dict, jsonPath: str=None, csvPath: str=None) -> None:
+    if jsonPath:
+        with open(jsonPath, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if csvPath:
+        with open(csvPath, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDS)
+            writer.writeheader()
+            for row in report['results']:
+                writer.writerow({field: row[field] for field in FIELDS})
+
+def compare(basePath: str, newPath: str, tolerance: float=0.1, timeTolerance: float=0.25) -> list:
+    """Regressions of a run against a baseline run, matched by map and heuristic
+
+    A regression is any increase in failures, or an increase of nodes expanded, path length or gear
+    changes by more than tolerance, or of wall time by more than timeTolerance (relative). A map and
+    heuristic in the baseline but missing from the new run is also a regression.
+
+    Returns:
+        list: (map, heuristic, field, baseline value, new value) of every regression, field is 'missing'
+            with None values for rows missing from the new run
+    """
+    with open(basePath) as f:
+        base = {(row['map'], row['heuristic']): row for row in json.load(f)['results']}
+    with open(newPath) as f:
+        new = {(row['map'], row['heuristic']): row for row in json.load(f)['results']}
+
+    regressions = [(*key, 'missing', None, None) for key in sorted(base.keys() - new.keys())]
+    for key in sorted(base.keys() & new.keys()):
+        for field in ['failures', 'nodes_expanded', 'path_length', 'gear_changes', 'wall_time']:
+            before, after = base[key][field], new[key][field]
+            allowed = 0 if field == 'failures' else (timeTolerance if field == 'wall_time' else tolerance)*before
+            if after > before + allowed:
+                regressions.append((*key, field, before, after))
+
+    for field in ['failures', 'nodes_expanded', 'path_length', 'gear_changes', 'wall_time']:
+        before = sum(base[key][field] for key in base.keys() & new.keys())
+        after = sum(new[key][field] for key in base.keys() & new.keys())
+        print(f"{field}: {before:.2f} -> {after:.2f} ({(after - before)/before*100 if before else 0:+.1f}%)")
+
+    for regression in regressions:
+        if regression[2] == 'missing':
+            print("REGRESSION {} {}: missing from {}".format(*regression[:2], newPath))
+        else:
+            print("REGRESSION {} {} {}: {:.2f} -> {:.2f}".format(*regression))
+
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark Hamiltonian and HybridAStar over test layouts")
+    parser.add_argument('--heuristics', nargs='+', default=HEURISTICS)
+    parser.add_argument('--random', type=int, default=3, help="number of random layouts")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the first random layout")
+    parser.add_argument('--obstacles', type=int, default=5, help="obstacles per random layout")
+    parser.add_argument('--json', help="write results to this JSON file")
+    parser.add_argument('--csv', help="write results to this CSV file")
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'NEW'), help="compare two JSON results and exit")
+    parser.add_argument('--tolerance', type=float, default=0.1, help="allowed relative increase before flagging")
+    parser.add_argument('--time-tolerance', type=float, default=0.25, help="allowed relative wall time increase")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, args.tolerance, args.time_tolerance) else 0)
+
+    save(run(args.heuristics, args.random, args.seed, args.obstacles), args.json, args.csv)
@@ -0,0 +1,154 @@
+import argparse
+import contextlib
+import io
+import math
+import time
+import numpy as np
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__ + '\..')))
+
+from enumerations import Gear, Steering
+from objects.OccupancyMap import OccupancyMap
+from pathfinding.hybrid_astar import HybridAStar
+from pathfinding.hamiltonian import Hamiltonian, obstacle_to_checkpoint_all
+from simulation.testing import get_maps
+from typing import List
+import utils
+import constants as c
+
+GEARS = {'F': Gear.FORWARD, 'B': Gear.REVERSE}
+STEERINGS = {'L': Steering.LEFT, 'S': Steering.STRAIGHT, 'R': Steering.RIGHT}
+
+def parse_command(command: str):
+    """Split a construct_path_2 command, e.g. 'LF027' is 27 degrees forward left and 'SB010' is 10cm reverse
+
+    Returns:
+        (Gear, Steering, int): gear, steering and amount (degrees when turning, cm when straight)
+    """
+    return GEARS[command[1]], STEERINGS[command[0]], int(command[2:])
+
+class Replay():
+    def __init__(self, map: OccupancyMap, minR: float=26.5, stepSize: float=2.5) -> None:
+        """Headless replay of construct_path_2 commands, driving the same kinematics as HybridAStar and
+        checking the car against the map the same way (car center, or the footprint in footprint mode)
+
+        Args:
+            map (OccupancyMap): map to check collisions against
+            minR (float, optional): turning radius the commands were planned with. Defaults to 26.5.
+            stepSize (float, optional): maximum distance between collision checks along a command in cm. Defaults to 2.5.
+        """
+        self.map = map
+        self.minR = minR
+        self.stepSize = stepSize
+
+    def sweep(self, command: str, x: float, y: float, theta: float):
+        """Rear axle poses along one command, start excluded and end included
+
+        Returns:
+            (np.array, np.array, np.array): x, y and heading of each sample
+        """
+        gear, steering, amount = parse_command(command)
+        distance = amount if steering == Steering.STRAIGHT else math.radians(amount)*self.minR
+        fractions = np.arange(1, max(math.ceil(distance/self.stepSize), 1) + 1)/max(math.ceil(distance/self.stepSize), 1)
+
+        if steering == Steering.STRAIGHT:
+            dx, dy, dthetas = gear*distance*fractions, 0*fractions, 0*fractions
+        else:
+            dthetas = -gear*steering*math.radians(amount)*fractions
+            dx = -steering*self.minR*np.sin(dthetas)
+            dy = -steering*self.minR*(1 - np.cos(dthetas))
+
+        cos_t, sin_t = math.cos(theta), math.sin(theta)
+        return x + dx*cos_t - dy*sin_t, y + dx*sin_t + dy*cos_t, utils.normalise_theta_array(theta + dthetas)
+
+    def run(self, commands: List[str], x_0: float, y_0: float, theta_0: float):
+        """Drive a command list from a rear axle pose
+
+        Args:
+            commands (List[str]): construct_path_2 commands
+            x_0 (float): starting x coordinate of rear axle
+            y_0 (float): starting y coordinate of rear axle
+            theta_0 (float): starting direction
+
+        Returns:
+            ((float, float, float), int): final rear axle pose, index of the first command that collides (None if none)
+        """
+        x, y, theta = x_0, y_0, theta_0
+        collision = None
+        for i, command in enumerate(commands):
+            xs, ys, thetas = self.sweep(command, x, y, theta)
+            if collision is None:
+                centers_x = xs + c.REAR_AXLE_TO_CENTER*np.cos(thetas)
+                centers_y = ys + c.REAR_AXLE_TO_CENTER*np.sin(thetas)
+                if self.map.footprint:
+                    blocked = self.map.collide_with_poses(centers_x, centers_y, thetas)
+                else:
+                    blocked = self.map.collide_with_points(centers_x, centers_y)
+                if blocked.any():
+                    collision = i
+
+            x, y, theta = float(xs[-1]), float(ys[-1]), float(thetas[-1])
+
+        return (x, y, theta), collision
+
+    def run_many(self, runs):
+        """run for a batch of (commands, x_0, y_0, theta_0)
+        """
+        return [self.run(*run) for run in runs]
+
+def plan_legs(obstacles, L: float, minR: float):
+    """Plan every leg of a layout like task1
+
+    Returns:
+        list: (commands, start pose, planned end pose) of each leg found
+    """
+    from pathfinding.pathcommands import construct_path_2
+
+    map = OccupancyMap(obstacles)
+    tsp = Hamiltonian(map, obstacles, 10, 10, 0, -np.pi/2, 'euclidean', minR)
+    current_pos = tsp.start
+    legs = []
+    for obstacle in tsp.find_optimal_path():
+        for checkpoint in obstacle_to_checkpoint_all(map, obstacle, theta_offset=-np.pi/2):
+            algo = HybridAStar(map=map, x_0=current_pos[0], y_0=current_pos[1], theta_0=current_pos[2],
+                               x_f=checkpoint[0], y_f=checkpoint[1], theta_f=checkpoint[2],
+                               steeringChangeCost=10, gearChangeCost=10, L=L, minR=minR, heuristic='euclidean')
+            path, _ = algo.find_path()
+            if path is not None:
+                commands, _ = construct_path_2(path, L, minR)
+                end = (path[-1].x, path[-1].y, path[-1].theta)
+                legs.append((commands, current_pos, end))
+                current_pos = end
+                break
+
+    return map, legs
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Plan the testing layouts and replay the commands of every leg headless")
+    parser.add_argument('--repeat', type=int, default=100, help="replays of every leg when timing")
+    args = parser.parse_args()
+
+    L = 26.5*np.pi/4/5
+    minR = 26.5
+    totalRuns = 0
+    totalTime = 0.
+    for i, obstacles in enumerate(get_maps()):
+        with contextlib.redirect_stdout(io.StringIO()): # planner progress prints
+            map, legs = plan_legs(obstacles, L, minR)
+
+        replay = Replay(map, minR)
+        runs = [(commands, *start) for commands, start, _ in legs]
+        results = replay.run_many(runs)
+        collisions = sum(collision is not None for _, collision in results)
+        errors = [math.hypot(pose[0] - end[0], pose[1] - end[1]) for (pose, _), (_, _, end) in zip(results, legs)]
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            replay.run_many(runs)
+        totalTime += time.perf_counter() - start
+        totalRuns += args.repeat*len(runs)
+
+        print(f"Map {i}: {len(legs)} legs, {collisions} colliding, max end error {max(errors, default=0):.2f}cm")
+
+    print(f"{totalRuns/totalTime:.0f} legs replayed per second")
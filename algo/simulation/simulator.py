@@ -7,7 +7,8 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__ + '\..')))
 
 from enumerations import Gear, Steering
 from objects.Border import Border, VirtualBorderWall
-from objects.Obstacle import Obstacle, VirtualWall
+from objects.Obstacle import Obstacle
+from objects.ObstacleSprite import ObstacleSprite, VirtualWall
 from objects.OccupancyMap import OccupancyMap
 from pathfinding.hybrid_astar import HybridAStar
 from pathfinding.hamiltonian import Hamiltonian, obstacle_to_checkpoint, obstacle_to_checkpoint_all
@@ -51,13 +52,14 @@ class Simulator:
         self.borders.add(top_border)
         self.borders.add(bottom_border)
 
-        self.obstacles = pygame.sprite.Group()
+        self.obstacles = obstacles
+        self.obstacle_sprites = pygame.sprite.Group()
         self.virtual_walls = pygame.sprite.Group()
         self.virtual_wall_surface = pygame.Surface((c.MAP_WIDTH, c.MAP_HEIGHT), pygame.SRCALPHA)
         self.virtual_wall_surface.fill((0, 0, 0, 0))
 
         for obstacle in obstacles:
-            self.obstacles.add(obstacle)
+            self.obstacle_sprites.add(ObstacleSprite(obstacle))
             vw = VirtualWall(obstacle.x_g, obstacle.y_g)
             self.virtual_walls.add(vw)
             self.virtual_wall_surface.blit(vw.image, (vw.rect.x - c.MAP_X0, vw.rect.y - c.MAP_Y0))
@@ -112,7 +114,7 @@ class Simulator:
             self.screen.blit(self.virtual_wall_surface, (c.MAP_X0, c.MAP_Y0))
             self.screen.blit(self.start_surface, (c.MAP_X0, c.MAP_Y0 + c.MAP_HEIGHT - 30*c.MAP_HEIGHT/200))
             self.borders.draw(self.screen)
-            self.obstacles.draw(self.screen)
+            self.obstacle_sprites.draw(self.screen)
 
             colors = [(0, 0, 0, 255), (0, 255, 0, 255), (0, 0, 255, 255), (0, 255, 255, 255)]
 
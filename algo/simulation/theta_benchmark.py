@@ -0,0 +1,45 @@
+import math
+import random
+import timeit
+import numpy as np
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__ + '\..')))
+
+import utils
+
+# normalise_theta before it was rewritten with math, kept to compare against
+def legacy_normalise_theta(theta: float):
+    p1 = legacy_truncated_remainder(theta + np.sign(theta) * np.pi, 2 * np.pi)
+    p2 = (np.sign(np.sign(theta)
+                  + 2 * (np.sign(math.fabs((legacy_truncated_remainder(theta + np.pi, 2 * np.pi))
+                                      / (2 * np.pi))) - 1))) * np.pi
+
+    return p1 - p2
+
+def legacy_truncated_remainder(dividend, divisor):
+    divided_number = dividend / divisor
+    divided_number = \
+        -int(-divided_number) if divided_number < 0 else int(divided_number)
+
+    return dividend - divisor * divided_number
+
+if __name__ == '__main__':
+    # headings of curved children, a heading in [-pi, pi] plus one primitive turn (task1 L and minR)
+    random.seed(0)
+    dtheta = 26.5*np.pi/4/5/26.5
+    thetas = [random.uniform(-math.pi, math.pi) + random.choice([-dtheta, dtheta]) for _ in range(10000)]
+    thetaArray = np.array(thetas)
+
+    assert max(abs(utils.normalise_theta(theta) - float(legacy_normalise_theta(theta))) for theta in thetas) < 1e-9
+    assert np.allclose(utils.normalise_theta_array(thetaArray), [utils.normalise_theta(theta) for theta in thetas])
+
+    repeat = 20
+    legacy = min(timeit.repeat(lambda: [legacy_normalise_theta(theta) for theta in thetas], number=1, repeat=repeat))/len(thetas)
+    scalar = min(timeit.repeat(lambda: [utils.normalise_theta(theta) for theta in thetas], number=1, repeat=repeat))/len(thetas)
+    batch = min(timeit.repeat(lambda: utils.normalise_theta_array(thetaArray), number=1, repeat=repeat))/len(thetas)
+
+    # each expansion normalises the headings of its 4 curved primitives (3 when one undoes the previous action)
+    print(f"legacy normalise_theta: {legacy*1e9:.0f} ns per call, {4*legacy*1e6:.2f} us per node")
+    print(f"normalise_theta:        {scalar*1e9:.0f} ns per call, {4*scalar*1e6:.2f} us per node")
+    print(f"normalise_theta_array:  {batch*1e9:.1f} ns per heading")
@@ -107,26 +107,15 @@ def diag_dist(x1: float, y1: float, x2: float, y2: float) -> float:
     dy = abs(y1 - y2)
     return math.sqrt(2*min(dx, dy)**2) + abs(dx - dy)
 
-def normalise_theta(theta: float):
-    revolutions = int((theta + np.sign(theta) * np.pi) / (2 * np.pi))
-
-    p1 = truncated_remainder(theta + np.sign(theta) * np.pi, 2 * np.pi)
-    p2 = (np.sign(np.sign(theta)
-                  + 2 * (np.sign(math.fabs((truncated_remainder(theta + np.pi, 2 * np.pi))
-                                      / (2 * np.pi))) - 1))) * np.pi
-
-    output_angle = p1 - p2
-
-    return output_angle
-
-def truncated_remainder(dividend, divisor):
-    divided_number = dividend / divisor
-    divided_number = \
-        -int(-divided_number) if divided_number < 0 else int(divided_number)
-
-    remainder = dividend - divisor * divided_number
+def normalise_theta(theta: float) -> float:
+    """Wrap an angle to (-pi, pi], pure math so it is cheap on scalars in the planner loop
+    """
+    return math.pi - (math.pi - theta) % (2*math.pi)
 
-    return remainder
+def normalise_theta_array(theta: np.ndarray) -> np.ndarray:
+    """normalise_theta for arrays of angles
+    """
+    return np.pi - np.mod(np.pi - np.asarray(theta, dtype=float), 2*np.pi)
 
 def M(theta):
     """
@@ -137,6 +126,13 @@ def M(theta):
     if theta >= math.pi: return theta - 2*math.pi
     return theta
 
+def M_array(theta):
+    """
+    M for arrays of angles, angle in [-pi, pi).
+    """
+    theta = np.mod(theta, 2*np.pi)
+    return np.where(theta >= np.pi, theta - 2*np.pi, theta)
+
 def R(x, y):
     """
     Return the polar coordinates (r, theta) of the point (x, y).